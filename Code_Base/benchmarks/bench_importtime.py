@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Track the cold-start cost of importing requests, per top-level package.
+
+Runs ``python -X importtime`` in fresh interpreters, with and without
+``RADIO_ANALYSER_LAZY_IMPORTS``, and reports the median self time spent in
+each top-level package. Run from ``Code_Base``::
+
+    python benchmarks/bench_importtime.py [--runs N] [--statement STMT]
+"""
+
+import argparse
+import collections
+import os
+import statistics
+import subprocess
+import sys
+
+_LINE_PREFIX = 'import time:'
+
+
+def _parse(stderr):
+    """Return ``{top-level package: self time in us}`` from importtime output."""
+    totals = collections.Counter()
+    for line in stderr.splitlines():
+        if not line.startswith(_LINE_PREFIX):
+            continue
+        fields = line[len(_LINE_PREFIX):].split('|')
+        try:
+            self_us = int(fields[0])
+        except ValueError:
+            continue  # the header line
+        totals[fields[2].strip().split('.')[0]] += self_us
+    return totals
+
+
+def _measure(statement, lazy, runs):
+    env = dict(os.environ)
+    env.pop('RADIO_ANALYSER_LAZY_IMPORTS', None)
+    if lazy:
+        env['RADIO_ANALYSER_LAZY_IMPORTS'] = '1'
+        statement = 'import radio_analyser; ' + statement
+
+    samples = collections.defaultdict(list)
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', statement],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True)
+        for package, us in _parse(proc.stderr).items():
+            samples[package].append(us)
+    return {package: statistics.median(values + [0] * (runs - len(values)))
+            for package, values in samples.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--runs', type=int, default=9)
+    parser.add_argument('--statement', default='import requests')
+    parser.add_argument('--top', type=int, default=15,
+                        help='number of packages to list')
+    args = parser.parse_args(argv)
+
+    eager = _measure(args.statement, False, args.runs)
+    lazy = _measure(args.statement, True, args.runs)
+
+    packages = sorted(set(eager) | set(lazy),
+                      key=lambda p: -max(eager.get(p, 0), lazy.get(p, 0)))
+    print('%-24s %10s %10s' % ('package', 'eager ms', 'lazy ms'))
+    for package in packages[:args.top]:
+        print('%-24s %10.2f %10.2f' % (
+            package, eager.get(package, 0) / 1e3, lazy.get(package, 0) / 1e3))
+    print('%-24s %10.2f %10.2f' % (
+        'total', sum(eager.values()) / 1e3, sum(lazy.values()) / 1e3))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
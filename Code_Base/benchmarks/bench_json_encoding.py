@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare ``Response.json()`` against ``radio_analyser.encoding.load_json`` on
+bodies served without a charset.
+
+``load_json`` runs with :func:`radio_analyser.mess.enable` in effect, as an
+application opting into the faster detection would. Run from ``Code_Base``::
+
+    python -m benchmarks.bench_json_encoding [--repeat N]
+
+``load_json`` must decode every payload exactly as ``Response.json()`` does;
+the script exits non-zero if it does not. The ``ok`` column reports whether
+they reproduce the source document, and ``cached`` whether an
+``EncodingCache`` primed by the previous payloads does.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+import requests
+from charset_normalizer import md
+
+from radio_analyser import mess
+from radio_analyser.encoding import EncodingCache, load_json
+
+_RECORD = {
+    'station': u'Radio Café Señal',
+    'location': u'Zürich - Gare du Nord',
+    'rssi': -71,
+    'snr': 9.5,
+    'tags': [u'fréquence', u'übertragung', u'señal'],
+}
+
+
+def _corpus():
+    """Yield ``(name, document, body)`` covering single- and multi-byte codecs."""
+    for size in (4, 64, 1024):
+        document = [_RECORD] * size
+        text = json.dumps(document, ensure_ascii=False)
+        for encoding in ('cp1252', 'latin_1', 'utf-8', 'utf-16-le'):
+            yield '%s x%d' % (encoding, size), document, text.encode(encoding)
+
+
+def _response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = 'http://radio.invalid/status.json'
+    response._content = body
+    return response
+
+
+def _json(body):
+    # Response.json() as shipped, without mess_ratio's cache carrying over
+    # between runs.
+    mess.disable()
+    md.mess_ratio.cache_clear()
+    return _response(body).json()
+
+
+def _load_json(body, cache=None):
+    mess.enable()
+    mess.mess_ratio.cache_clear()
+    return load_json(_response(body), cache=cache)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cache = EncodingCache()
+    failed = False
+    print('%-18s %12s %4s %12s %8s %12s %6s' % (
+        'payload', 'json()', 'ok', 'load_json', 'speedup', 'cached', 'ok'))
+    for name, document, body in _corpus():
+        expected = _json(body)
+        if _load_json(body) != expected:
+            print('%-18s MISMATCH' % name)
+            failed = True
+            continue
+        cached_ok = _load_json(body, cache) == document
+
+        baseline = min(timeit.repeat(
+            lambda: _json(body), number=1, repeat=args.repeat))
+        isolated = min(timeit.repeat(
+            lambda: _load_json(body), number=1, repeat=args.repeat))
+        cached = min(timeit.repeat(
+            lambda: _load_json(body, cache), number=1, repeat=args.repeat))
+        print('%-18s %10.2fms %4s %10.2fms %7.1fx %10.2fms %6s' % (
+            name, baseline * 1e3, 'yes' if expected == document else 'no',
+            isolated * 1e3, baseline / isolated, cached * 1e3,
+            'yes' if cached_ok else 'no'))
+    mess.disable()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
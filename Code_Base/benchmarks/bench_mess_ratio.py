@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare ``charset_normalizer.md.mess_ratio`` against the batched engine in
+``radio_analyser.mess``, chunk by chunk and through ``from_bytes``.
+
+For every payload, each candidate codec ``from_bytes`` would try is used to
+decode its first 512 bytes, and both engines score the resulting chunks.
+Run from ``Code_Base``::
+
+    python -m benchmarks.bench_mess_ratio [--repeat N]
+
+The script exits non-zero if the engines disagree on any chunk, or if
+``from_bytes`` picks a different codec with the batched engine.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from charset_normalizer import from_bytes, md
+from charset_normalizer.constant import IANA_SUPPORTED
+
+from radio_analyser import mess
+
+_TEXTS = {
+    'en': u'Radio One - now playing: The Quick Brown Fox (live), 128kbps',
+    'fr': u'Radio Café Señal - Le cœur déçu, l\'âme plutôt naïve, à Zürich',
+    'de': u'Zwölf Boxkämpfer jagen Viktor quer über den großen Sylter Deich',
+    'ru': u'Съешь же ещё этих мягких французских булок да выпей чаю',
+    'el': u'Τάχιστη αλώπηξ βαφής ψημένη γη, δρασκελίζει υπέρ νωθρού κυνός',
+    'zh': u'我能吞下玻璃而不伤身体。北京人民广播电台，现在播放新闻。',
+    'ja': u'いろはにほへと ちりぬるを わかよたれそ つねならむ ラジオ放送',
+    'ko': u'키스의 고유조건은 입술끼리 만나야 하고 특별한 기술은 필요치 않다',
+}
+
+#: Payloads as ``(language, codec)``, single-byte first.
+_PAYLOADS = [
+    ('en', 'ascii'), ('fr', 'cp1252'), ('de', 'latin_1'),
+    ('ru', 'cp1251'), ('ru', 'koi8_r'), ('el', 'iso8859_7'),
+    ('fr', 'utf_8'), ('ru', 'utf_8'), ('zh', 'gb18030'), ('zh', 'utf_8'),
+    ('ja', 'shift_jis'), ('ja', 'euc_jp'), ('ko', 'euc_kr'),
+    ('de', 'utf_16_le'),
+]
+
+
+def _body(language, codec):
+    document = [{'station': _TEXTS[language], 'rssi': -71 - i, 'snr': 9.5}
+                for i in range(16)]
+    return json.dumps(document, ensure_ascii=False).encode(codec)
+
+
+def _chunks(body):
+    """Decode the head of ``body`` with every codec that accepts it."""
+    chunks = []
+    for codec in IANA_SUPPORTED:
+        try:
+            chunks.append(body[:512].decode(codec))
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return chunks
+
+
+def _time(function, chunks, repeat):
+    def run():
+        for chunk in chunks:
+            function(chunk, 0.2)
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def _detect(body, repeat):
+    def run():
+        md.mess_ratio.cache_clear()
+        mess.mess_ratio.cache_clear()
+        return from_bytes(body).best()
+    elapsed = min(timeit.repeat(run, number=1, repeat=repeat))
+    best = run()
+    return elapsed, best.encoding if best is not None else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    original = md.mess_ratio.__wrapped__
+    batched = mess.mess_ratio.__wrapped__
+
+    failed = False
+    print('%-20s %6s %11s %11s %8s %11s %11s %8s' % (
+        'payload', 'chunks', 'original', 'batched', 'speedup',
+        'from_bytes', 'batched', 'speedup'))
+    for language, codec in _PAYLOADS:
+        name = '%s/%s' % (language, codec)
+        body = _body(language, codec)
+        chunks = _chunks(body)
+        for chunk in chunks:
+            for threshold in (0.2, 1e9):
+                if original(chunk, threshold) != batched(chunk, threshold):
+                    print('%-20s MISMATCH on %r' % (name, chunk[:40]))
+                    failed = True
+
+        slow = _time(original, chunks, args.repeat)
+        fast = _time(batched, chunks, args.repeat)
+
+        mess.disable()
+        slow_detect, slow_codec = _detect(body, args.repeat)
+        mess.enable()
+        fast_detect, fast_codec = _detect(body, args.repeat)
+        if slow_codec != fast_codec:
+            print('%-20s detected %s instead of %s' % (
+                name, fast_codec, slow_codec))
+            failed = True
+
+        print('%-20s %6d %9.2fms %9.2fms %7.1fx %9.2fms %9.2fms %7.1fx' % (
+            name, len(chunks), slow * 1e3, fast * 1e3, slow / fast,
+            slow_detect * 1e3, fast_detect * 1e3, slow_detect / fast_detect))
+    mess.disable()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser
+~~~~~~~~~~~~~~
+
+JSON web scraping and analytics for IoT radio endpoints, built on top of
+:mod:`requests`.
+
+Submodules are imported on first use, so ``import radio_analyser`` does not
+by itself import requests. Set ``RADIO_ANALYSER_LAZY_IMPORTS=1`` to also
+defer the heavy dependencies of requests; see :mod:`radio_analyser.lazy`.
+"""
+
+import importlib
+import os
+
+#: Public names and the submodule each one lives in.
+_EXPORTS = {
+    'iter_json': 'streaming',
+    'JSONRecordSplitter': 'streaming',
+    'detect_json_encoding': 'encoding',
+    'load_json': 'encoding',
+    'EncodingCache': 'encoding',
+    'iter_batch': 'batch',
+    'BatchResult': 'batch',
+    'RequestTemplate': 'templates',
+    'Session': 'sessions',
+    'CachingAdapter': 'cache',
+    'Instrumentation': 'instrumentation',
+    'InstrumentedHTTPAdapter': 'instrumentation',
+    'read_buffer': 'body',
+    'BufferedResponse': 'body',
+    'AlertPlayer': 'alerts',
+    'NullSink': 'alerts',
+    'HealthTracker': 'health',
+    'CircuitBreakerAdapter': 'health',
+    'CircuitOpenError': 'health',
+}
+
+__all__ = sorted(_EXPORTS)
+
+if os.environ.get('RADIO_ANALYSER_LAZY_IMPORTS', '').lower() in (
+        '1', 'true', 'yes'):
+    from . import lazy as _lazy
+    _lazy.enable()
+
+
+def __getattr__(name):
+    try:
+        module = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError('module %r has no attribute %r'
+                             % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.alerts
+~~~~~~~~~~~~~~~~~~~~~
+
+Audible alerts that never hold up the caller.
+
+``chime.success()`` and friends resolve the theme directory, check the file
+exists and start a shell running ``aplay`` on every call, so a burst of
+anomalies forks a shell and a player per event. :class:`AlertPlayer`
+instead loads the theme's sounds once and plays them from a single worker
+thread fed by a bounded queue. Repeats of an event within a time window are
+coalesced into one sound, and anything the queue cannot take is dropped and
+counted rather than waited for.
+"""
+
+import platform
+import queue
+import random
+import subprocess
+import threading
+import time
+import warnings
+
+import chime
+
+#: The events every chime theme provides a sound for.
+EVENTS = ('success', 'warning', 'error', 'info')
+
+_STOP = object()
+
+
+class AlertError(RuntimeError):
+    """A sound could not be played."""
+
+
+class NullSink(object):
+    """Audio sink that plays nothing and remembers what it was asked to.
+
+    Useful for tests and for running the analyser headless.
+    """
+
+    def __init__(self):
+        self.played = []
+
+    def play(self, event, data, path):
+        self.played.append(event)
+
+
+class SubprocessSink(object):
+    """Plays sounds through the platform's command-line player.
+
+    No shell is involved. On Linux the preloaded data is piped to
+    ``aplay``; ``afplay`` on macOS needs the file path.
+
+    :param system: (optional) platform name; defaults to the running one.
+    :param timeout: (optional) seconds after which a player that has not
+        finished is killed and the sound counted as failed.
+    """
+
+    def __init__(self, system=None, timeout=10.0):
+        self.system = system or platform.system()
+        self.timeout = timeout
+
+    def play(self, event, data, path):
+        if self.system == 'Darwin':
+            args, stdin = ['afplay', str(path)], None
+        elif self.system == 'Linux':
+            args, stdin = ['aplay', '-q', '-'], data
+        else:
+            raise AlertError('Unsupported platform (%s)' % self.system)
+        try:
+            proc = subprocess.run(args, input=stdin, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise AlertError('%s did not finish within %s seconds' % (
+                args[0], self.timeout))
+        except OSError as e:
+            raise AlertError('%s: %s' % (args[0], e))
+        if proc.returncode:
+            raise AlertError('%s exited with %d: %s' % (
+                args[0], proc.returncode,
+                proc.stderr.decode(errors='replace').strip()))
+
+
+class WinsoundSink(object):
+    """Plays sounds from memory with :mod:`winsound`."""
+
+    def play(self, event, data, path):
+        import winsound
+        try:
+            winsound.PlaySound(data, winsound.SND_MEMORY)
+        except RuntimeError as e:
+            raise AlertError(str(e))
+
+
+def default_sink():
+    """Return the sink suited to the running platform."""
+    if platform.system() == 'Windows':
+        return WinsoundSink()
+    return SubprocessSink()
+
+
+def load_theme(name=None):
+    """Read every event sound of a chime theme into memory.
+
+    :param name: (optional) theme name; defaults to chime's current theme.
+        ``'random'`` picks one theme for the lifetime of the result.
+    :raises ValueError: if the theme is unknown or lacks a sound.
+    :rtype: dict mapping event to ``(data, path)``
+    """
+    name = name or chime.theme()
+    if name == 'random':
+        name = random.choice(chime.themes())
+    if name not in chime.themes():
+        raise ValueError('Unknown theme (%s)' % name)
+
+    sounds = {}
+    directory = chime.themes_dir().joinpath(name)
+    for event in EVENTS:
+        path = directory.joinpath('%s.wav' % event)
+        try:
+            sounds[event] = (path.read_bytes(), path)
+        except OSError as e:
+            raise ValueError('Theme %s has no %s sound: %s' % (name, event, e))
+    return sounds
+
+
+class AlertPlayer(object):
+    """Plays chime sounds from one long-lived worker thread.
+
+    Usage::
+
+      >>> from radio_analyser.alerts import AlertPlayer
+      >>> alerts = AlertPlayer()
+      >>> alerts.warning()
+      >>> alerts.close()
+
+    :param theme: (optional) chime theme to preload.
+    :param sink: (optional) object whose ``play(event, data, path)`` makes
+        the sound; defaults to :func:`default_sink`.
+    :param window: (optional) seconds during which repeats of an event are
+        coalesced into the one already accepted.
+    :param max_queue: (optional) number of sounds that may wait to play.
+    :param on_error: (optional) called with the exception when a sound
+        fails to play; by default a warning is issued.
+    :param clock: (optional) monotonic clock, replaceable in tests.
+    """
+
+    def __init__(self, theme=None, sink=None, window=1.0, max_queue=16,
+                 on_error=None, clock=time.monotonic):
+        self.sounds = load_theme(theme)
+        self.sink = sink if sink is not None else default_sink()
+        self.window = window
+        self.on_error = on_error
+        self.clock = clock
+
+        self.stats = dict.fromkeys(
+            ('accepted', 'coalesced', 'dropped', 'played', 'failed'), 0)
+        self._last = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(max_queue)
+        self._closed = False
+        # Set when close() gave up waiting: the worker then drops whatever
+        # is still queued and exits.
+        self._abort = threading.Event()
+        self._worker = threading.Thread(target=self._run,
+                                        name='radio-analyser-alerts')
+        self._worker.daemon = True
+        self._worker.start()
+
+    def notify(self, event):
+        """Queue ``event`` to be played; never blocks.
+
+        :returns: ``True`` if the sound was queued, ``False`` if it was
+            coalesced with a recent one or the queue was full.
+        :raises ValueError: if ``event`` is not one of :data:`EVENTS`.
+        """
+        if event not in self.sounds:
+            raise ValueError('Unknown event (%s)' % event)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('AlertPlayer is closed')
+            now = self.clock()
+            last = self._last.get(event)
+            if last is not None and now - last < self.window:
+                self.stats['coalesced'] += 1
+                return False
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.stats['dropped'] += 1
+                return False
+            self._last[event] = now
+            self.stats['accepted'] += 1
+            return True
+
+    def success(self):
+        return self.notify('success')
+
+    def warning(self):
+        return self.notify('warning')
+
+    def error(self):
+        return self.notify('error')
+
+    def info(self):
+        return self.notify('info')
+
+    def join(self):
+        """Block until every queued sound has been played."""
+        self._queue.join()
+
+    def close(self, timeout=None):
+        """Stop accepting events, play what is queued and stop the worker.
+
+        :param timeout: (optional) seconds to wait for that. If the sink is
+            still busy by then, sounds not yet played are dropped and the
+            worker exits once the current one returns.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        start = time.monotonic()
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            self._stop_now()
+            return
+        if timeout is not None:
+            timeout = max(0.0, timeout - (time.monotonic() - start))
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            self._stop_now()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _stop_now(self):
+        self._abort.set()
+        try:
+            # Wakes a worker that has emptied the queue in the meantime.
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            try:
+                if event is _STOP:
+                    return
+                if self._abort.is_set():
+                    with self._lock:
+                        self.stats['dropped'] += 1
+                else:
+                    self._play(event)
+            finally:
+                self._queue.task_done()
+            if self._abort.is_set() and self._queue.empty():
+                return
+
+    def _play(self, event):
+        data, path = self.sounds[event]
+        try:
+            self.sink.play(event, data, path)
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            self._report(e)
+        else:
+            with self._lock:
+                self.stats['played'] += 1
+
+    def _report(self, exc):
+        if self.on_error is not None:
+            try:
+                self.on_error(exc)
+            except Exception:
+                pass
+        else:
+            warnings.warn('Could not play alert: %s' % exc, RuntimeWarning)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.batch
+~~~~~~~~~~~~~~~~~~~~
+
+Concurrent fetching of many requests through a single
+:class:`requests.Session`.
+
+Requests are sent from a bounded thread pool. No host ever has more requests
+in flight than the connection pool its adapter keeps for it, so a batch
+never fights over pooled connections (or trips ``EmptyPoolError`` when the
+adapter was mounted with ``pool_block=True``). Requests are pulled from the
+caller's iterable only as capacity frees up, and responses are yielded in
+completion order.
+"""
+
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from requests.utils import urlparse
+
+#: Default number of requests in flight across all hosts.
+DEFAULT_MAX_IN_FLIGHT = 32
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class BatchResult(collections.namedtuple(
+        'BatchResult', ['request', 'response', 'exception'])):
+    """Outcome of one request in a batch.
+
+    Exactly one of ``response`` and ``exception`` is set.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.exception is None
+
+
+def host_key(url):
+    """Return the ``(scheme, host, port)`` triple ``PoolManager`` pools on.
+
+    :rtype: tuple
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    port = parsed.port or _DEFAULT_PORTS.get(scheme)
+    return scheme, (parsed.hostname or '').lower(), port
+
+
+def host_limit(session, url):
+    """Return how many requests to ``url``'s host may run at once.
+
+    This is the ``maxsize`` of the connection pools the mounted adapter
+    creates, i.e. its ``pool_maxsize``.
+
+    :rtype: int
+    """
+    adapter = session.get_adapter(url)
+    if isinstance(adapter, HTTPAdapter):
+        pool_kw = adapter.poolmanager.connection_pool_kw
+        return max(1, pool_kw.get('maxsize', DEFAULT_POOLSIZE))
+    return DEFAULT_POOLSIZE
+
+
+class _Scheduler(object):
+    """Book-keeping of in-flight and deferred requests per host."""
+
+    def __init__(self, session, per_host):
+        self.session = session
+        self.per_host = per_host
+        self.limits = {}
+        self.running = collections.Counter()
+        self.deferred = collections.defaultdict(collections.deque)
+        self.deferred_count = 0
+
+    def _limit(self, key, url):
+        if key not in self.limits:
+            limit = host_limit(self.session, url)
+            if self.per_host is not None:
+                limit = min(limit, self.per_host)
+            self.limits[key] = limit
+        return self.limits[key]
+
+    def admit(self, request):
+        """Return ``(key, True)`` if ``request`` may start now, else defer it."""
+        key = host_key(request.url)
+        if self.running[key] < self._limit(key, request.url):
+            self.running[key] += 1
+            return key, True
+        self.deferred[key].append(request)
+        self.deferred_count += 1
+        return key, False
+
+    def release(self, key):
+        """Free a slot for ``key``, returning a deferred request to start."""
+        queue = self.deferred.get(key)
+        if queue:
+            self.deferred_count -= 1
+            request = queue.popleft()
+            if not queue:
+                del self.deferred[key]
+            return request
+        self.running[key] -= 1
+        return None
+
+    def drain(self):
+        for queue in self.deferred.values():
+            for request in queue:
+                yield request
+        self.deferred.clear()
+        self.deferred_count = 0
+
+
+def iter_batch(session, requests, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+               per_host=None, raise_on_error=True, max_deferred=None,
+               **send_kwargs):
+    """Send ``requests`` concurrently, yielding results as they complete.
+
+    :param session: the :class:`requests.Session` to send through.
+    :param requests: an iterable of :class:`requests.Request` objects. It is
+        consumed lazily, so it may be a generator over a very large batch.
+    :param max_in_flight: (optional) maximum number of requests being sent
+        at once across all hosts.
+    :param per_host: (optional) further cap on concurrent requests per host.
+        Hosts are always limited to the adapter's ``pool_maxsize``.
+    :param raise_on_error: (optional) if ``True`` the first failure cancels
+        the rest of the batch and is re-raised; otherwise failures are
+        yielded as :class:`BatchResult` objects carrying the exception.
+    :param max_deferred: (optional) how many requests may wait for a busy
+        host before the iterable stops being read. Defaults to
+        ``4 * max_in_flight``.
+    :param \\*\\*send_kwargs: optional arguments that ``Session.request``
+        takes for sending, e.g. ``timeout``, ``stream``, ``verify``.
+    :rtype: generator of :class:`BatchResult`
+    """
+    if max_in_flight < 1:
+        raise ValueError('max_in_flight must be at least 1')
+    if max_deferred is None:
+        max_deferred = 4 * max_in_flight
+
+    proxies = send_kwargs.pop('proxies', None) or {}
+    stream = send_kwargs.pop('stream', None)
+    verify = send_kwargs.pop('verify', None)
+    cert = send_kwargs.pop('cert', None)
+
+    def send(request):
+        prep = session.prepare_request(request)
+        settings = session.merge_environment_settings(
+            prep.url, proxies, stream, verify, cert)
+        kwargs = dict(send_kwargs)
+        kwargs.update(settings)
+        return session.send(prep, **kwargs)
+
+    scheduler = _Scheduler(session, per_host)
+    pending = iter(requests)
+    exhausted = False
+    futures = {}
+
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def start(request, key):
+        futures[executor.submit(send, request)] = (request, key)
+
+    def fill():
+        # Pull from the caller's iterable only while there is room to run
+        # or park what we pull.
+        while (not exhausted and len(futures) < max_in_flight
+               and scheduler.deferred_count < max_deferred):
+            try:
+                request = next(pending)
+            except StopIteration:
+                return True
+            key, admitted = scheduler.admit(request)
+            if admitted:
+                start(request, key)
+        return exhausted
+
+    try:
+        exhausted = fill()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                request, key = futures.pop(future)
+                exception = future.exception()
+                if exception is not None and raise_on_error:
+                    raise exception
+                nxt = scheduler.release(key)
+                if nxt is not None:
+                    start(nxt, key)
+                if exception is None:
+                    yield BatchResult(request, future.result(), None)
+                else:
+                    yield BatchResult(request, None, exception)
+            exhausted = fill()
+    finally:
+        # On failure or early exit by the caller, drop everything that has
+        # not started and close whatever is still in flight.
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        list(scheduler.drain())
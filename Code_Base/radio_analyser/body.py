@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.body
+~~~~~~~~~~~~~~~~~~~
+
+Reading response bodies into a single buffer.
+
+``Response.content`` collects the body as a list of ``bytes`` chunks and then
+joins them, so at the end of the read the body is held twice. For large JSON
+documents :func:`read_buffer` avoids that:
+
+* uncompressed bodies are read straight from the socket into a
+  ``bytearray`` sized from ``Content-Length`` (or grown geometrically when
+  the length is unknown), through ``readinto`` on a ``memoryview``;
+* compressed bodies are decoded chunk by chunk into the same kind of
+  buffer, so only one decoded chunk exists besides the buffer at any time.
+
+The buffer stays on the response as ``response.buffer``; ``bytes`` for
+``response.content`` (and so ``.text`` and ``.json()``) are only made from
+it if one of those is used.
+"""
+
+from requests.exceptions import (ChunkedEncodingError, ConnectionError,
+                                 ContentDecodingError, StreamConsumedError)
+from requests.models import CONTENT_CHUNK_SIZE, Response
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+#: Capacity of the buffer when the body length is unknown.
+INITIAL_BUFFER_SIZE = 64 * 1024
+
+#: Largest buffer allocated up front from ``Content-Length``; a bigger body
+#: grows the buffer as it arrives, so a bogus length costs nothing.
+MAX_INITIAL_BUFFER_SIZE = 16 * 1024 * 1024
+
+
+class _Buffer(object):
+    """A ``bytearray`` that is filled from the front and grows on demand."""
+
+    def __init__(self, size_hint):
+        self.data = bytearray(size_hint or INITIAL_BUFFER_SIZE)
+        self.size = 0
+
+    def reserve(self, n):
+        """Make room for at least ``n`` more bytes."""
+        needed = self.size + n
+        if needed > len(self.data):
+            self.data.extend(bytes(max(needed, 2 * len(self.data))
+                                   - len(self.data)))
+
+    def readinto(self, fp, chunk_size):
+        """Read from ``fp`` until EOF; returns the number of bytes read."""
+        start = self.size
+        while True:
+            if self.size == len(self.data):
+                # A body that exactly fills a pre-sized buffer has usually
+                # been read in full already; don't double it to find out.
+                if fp.isclosed():
+                    break
+                self.reserve(chunk_size)
+            with memoryview(self.data) as view:
+                n = fp.readinto(view[self.size:])
+            if not n:
+                break
+            self.size += n
+        return self.size - start
+
+    def write(self, chunk):
+        self.reserve(len(chunk))
+        self.data[self.size:self.size + len(chunk)] = chunk
+        self.size += len(chunk)
+
+    def finish(self):
+        del self.data[self.size:]
+        return self.data
+
+
+class _BufferedMixin(object):
+    """Serves ``content`` from ``buffer``, copying it on first access."""
+
+    #: The ``bytearray`` :func:`read_buffer` read the body into.
+    buffer = None
+
+    @property
+    def content(self):
+        if self._content is False and self.buffer is not None:
+            self._content = bytes(self.buffer)
+        return super(_BufferedMixin, self).content
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        self.content
+        return super(_BufferedMixin, self).iter_content(
+            chunk_size, decode_unicode)
+
+    def __getstate__(self):
+        self.content
+        return super(_BufferedMixin, self).__getstate__()
+
+
+class BufferedResponse(_BufferedMixin, Response):
+    """A :class:`requests.Response` whose body was read by
+    :func:`read_buffer`."""
+
+
+_BUFFERED_CLASSES = {Response: BufferedResponse}
+
+
+def _buffered_class(cls):
+    if issubclass(cls, _BufferedMixin):
+        return cls
+    buffered = _BUFFERED_CLASSES.get(cls)
+    if buffered is None:
+        buffered = _BUFFERED_CLASSES[cls] = type(
+            'Buffered' + cls.__name__, (_BufferedMixin, cls), {})
+    return buffered
+
+
+def _content_length(response):
+    try:
+        length = int(response.headers.get('Content-Length', ''))
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+
+def _is_identity(response):
+    encoding = response.headers.get('Content-Encoding', '')
+    return encoding.strip().lower() in ('', 'identity')
+
+
+def read_buffer(response, chunk_size=CONTENT_CHUNK_SIZE):
+    """Read the body of ``response`` into a single ``bytearray``.
+
+    The buffer is also kept as ``response.buffer``, and the response
+    becomes a :class:`BufferedResponse`: ``response.content`` still returns
+    ``bytes``, copied from the buffer the first time it is used.
+    ``json.loads`` accepts the buffer as it is, without that copy. Calling
+    this again returns the same buffer; on a response whose content was
+    already read the usual way it returns a ``memoryview`` of it instead of
+    copying.
+
+    Make the request with ``stream=True``, otherwise requests has already
+    read the body the usual way.
+
+    :param response: the :class:`requests.Response` to read.
+    :param chunk_size: (optional) growth step and decoded chunk size.
+    :rtype: bytearray or memoryview
+    """
+    if response._content_consumed:
+        buffer = getattr(response, 'buffer', None)
+        if buffer is not None:
+            return buffer
+        if isinstance(response._content, bool):
+            raise StreamConsumedError()
+        return memoryview(response._content or b'')
+
+    raw = response.raw
+    fp = getattr(raw, '_fp', None)
+    length = _content_length(response) if _is_identity(response) else None
+    untouched = getattr(raw, '_fp_bytes_read', None) == 0
+
+    if length is not None:
+        length = min(length, MAX_INITIAL_BUFFER_SIZE)
+    buf = _Buffer(length)
+    try:
+        if fp is not None and untouched and _is_identity(response):
+            with raw._error_catcher():
+                raw._fp_bytes_read += buf.readinto(fp, chunk_size)
+        else:
+            for chunk in response.iter_content(chunk_size):
+                buf.write(chunk)
+    except ProtocolError as e:
+        raise ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise ConnectionError(e)
+
+    response.__class__ = _buffered_class(type(response))
+    response.buffer = buf.finish()
+    response._content_consumed = True
+    return response.buffer
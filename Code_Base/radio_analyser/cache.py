@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.cache
+~~~~~~~~~~~~~~~~~~~~
+
+A conditional-GET caching transport adapter.
+
+Most polls of a radio return exactly what the previous poll did. The
+:class:`CachingAdapter` keeps the last response for each URL together with
+its ``ETag``/``Last-Modified`` validators, turns repeat requests into
+``If-None-Match``/``If-Modified-Since`` requests, and rebuilds the stored
+:class:`requests.Response` when the server answers ``304 Not Modified``.
+Responses still fresh under ``Cache-Control``/``Expires`` are served without
+touching the network at all.
+
+Entries live in a bounded in-memory LRU tier, optionally backed by an
+on-disk tier that survives restarts.
+"""
+
+import collections
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+#: Headers of a ``304`` response that replace the stored ones (RFC 7232 4.1).
+_REFRESHED_HEADERS = ('cache-control', 'content-location', 'date', 'etag',
+                      'expires', 'last-modified', 'vary')
+
+#: Response attributes stored in the cache (``Response.__attrs__`` minus the
+#: request and redirect history, which belong to the original exchange).
+_STORED_ATTRS = ('_content', 'status_code', 'headers', 'url', 'encoding',
+                 'reason', 'cookies', 'elapsed')
+
+
+def parse_cache_control(value):
+    """Parse a ``Cache-Control`` header into a dict of lower-case directives.
+
+    Directives without an argument map to ``True``.
+
+    :rtype: dict
+    """
+    directives = {}
+    for part in (value or '').split(','):
+        name, sep, arg = part.strip().partition('=')
+        if not name:
+            continue
+        directives[name.lower()] = arg.strip('"') if sep else True
+    return directives
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class CacheStats(object):
+    """Thread-safe hit/miss counters for a :class:`CachingAdapter`."""
+
+    __slots__ = ('hits', 'revalidated', 'misses', 'stores', 'bytes_saved',
+                 '_lock')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.revalidated = 0
+            self.misses = 0
+            self.stores = 0
+            self.bytes_saved = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.__slots__
+                    if not name.startswith('_')}
+
+    def __repr__(self):
+        return '<CacheStats %r>' % self.as_dict()
+
+
+class MemoryCache(object):
+    """Bounded least-recently-used store of cache entries.
+
+    :param max_entries: (optional) maximum number of entries kept.
+    :param max_bytes: (optional) maximum total size of cached bodies.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry['response']['_content'] or b'')
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry['response']['_content'] or b'')
+
+
+class DiskCache(object):
+    """Cache entries persisted as one file each under ``directory``.
+
+    Files are written atomically and read back through ``mmap``, so loading
+    a large body does not first copy the file into a separate buffer. Only
+    files named like the ones written here are ever read or removed, so the
+    directory may be shared with other data.
+
+    :param directory: where entries are kept; created if missing.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    #: Suffix of entry files; temporary files add ``.tmp`` to it.
+    suffix = '.rcache'
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + self.suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    entry = pickle.loads(m)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            # Missing, empty, or a partial write from an older process.
+            return None
+        if entry.get('key') != key:
+            return None
+        return entry
+
+    def set(self, key, entry):
+        fd, tmp = tempfile.mkstemp(dir=self.directory,
+                                   suffix=self.suffix + '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove the entries written here, leaving any other file alone."""
+        owned = re.compile(r'(?:[0-9a-f]{64}|tmp\w+)%s(?:\.tmp)?\Z'
+                           % re.escape(self.suffix))
+        for name in os.listdir(self.directory):
+            if not owned.match(name):
+                continue
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class CachingAdapter(HTTPAdapter):
+    """An :class:`~requests.adapters.HTTPAdapter` that caches ``GET``
+    responses and revalidates them with conditional requests.
+
+    Usage::
+
+      >>> import requests
+      >>> from radio_analyser.cache import CachingAdapter
+      >>> s = requests.Session()
+      >>> s.mount('http://', CachingAdapter(cache_dir='/var/cache/radios'))
+
+    Responses carry ``from_cache``, which is ``True`` when they were served
+    from the cache. Bodies are read in full before being stored, so
+    ``stream=True`` gains nothing for cacheable responses.
+
+    :param cache_dir: (optional) directory for the on-disk tier. Without it
+        entries are only kept in memory.
+    :param max_entries: (optional) size of the in-memory LRU tier.
+    :param max_bytes: (optional) total body size of the in-memory tier.
+    :param \\*\\*kwargs: optional arguments that ``HTTPAdapter`` takes.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=256,
+                 max_bytes=64 * 1024 * 1024, **kwargs):
+        self.memory = MemoryCache(max_entries, max_bytes)
+        self.disk = DiskCache(cache_dir) if cache_dir else None
+        self.stats = CacheStats()
+        super(CachingAdapter, self).__init__(**kwargs)
+
+    def __getstate__(self):
+        state = super(CachingAdapter, self).__getstate__()
+        state['cache_dir'] = self.disk.directory if self.disk else None
+        state['cache_limits'] = (self.memory.max_entries,
+                                 self.memory.max_bytes)
+        return state
+
+    def __setstate__(self, state):
+        cache_dir = state.pop('cache_dir', None)
+        max_entries, max_bytes = state.pop('cache_limits', (256, 64 << 20))
+        self.memory = MemoryCache(max_entries, max_bytes)
+        self.disk = DiskCache(cache_dir) if cache_dir else None
+        self.stats = CacheStats()
+        super(CachingAdapter, self).__setstate__(state)
+
+    @staticmethod
+    def cache_key(request):
+        return '%s %s' % (request.method, request.url)
+
+    def get_entry(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def set_entry(self, key, entry):
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+    def delete_entry(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        """Drop every cached entry from both tiers."""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def build_response(self, req, resp):
+        response = super(CachingAdapter, self).build_response(req, resp)
+        response.from_cache = False
+        return response
+
+    def send(self, request, **kwargs):
+        """Sends PreparedRequest object, answering from the cache if possible.
+
+        Takes the same arguments as :meth:`HTTPAdapter.send`.
+
+        :rtype: requests.Response
+        """
+        if request.method != 'GET':
+            if request.method not in ('HEAD', 'OPTIONS', 'TRACE'):
+                # Unsafe methods invalidate what we hold for the URL.
+                self.delete_entry('GET %s' % request.url)
+            return super(CachingAdapter, self).send(request, **kwargs)
+
+        request_cc = parse_cache_control(request.headers.get('Cache-Control'))
+        if 'no-store' in request_cc:
+            return super(CachingAdapter, self).send(request, **kwargs)
+
+        key = self.cache_key(request)
+        entry = self.get_entry(key)
+        if entry is not None and not self._vary_matches(entry, request):
+            entry = None
+
+        if entry is not None:
+            if 'no-cache' not in request_cc and self._is_fresh(entry):
+                self.stats.incr('hits')
+                self.stats.incr('bytes_saved', self._body_size(entry))
+                return self._rebuild(entry, request)
+            request = self._conditional(request, entry)
+
+        resp = super(CachingAdapter, self).send(request, **kwargs)
+
+        if entry is not None and resp.status_code == 304:
+            entry = self._refresh(entry, resp)
+            # Reading the (empty) body hands the connection back to the
+            # pool; closing the response would close the socket instead.
+            resp.content
+            self.set_entry(key, entry)
+            self.stats.incr('revalidated')
+            self.stats.incr('bytes_saved', self._body_size(entry))
+            return self._rebuild(entry, request)
+
+        self.stats.incr('misses')
+        if self._is_cacheable(resp):
+            self.set_entry(key, self._make_entry(key, request, resp))
+            self.stats.incr('stores')
+        elif entry is not None:
+            self.delete_entry(key)
+        return resp
+
+    @staticmethod
+    def _body_size(entry):
+        return len(entry['response']['_content'] or b'')
+
+    @staticmethod
+    def _vary_matches(entry, request):
+        return all(request.headers.get(name) == value
+                   for name, value in entry['vary'].items())
+
+    @staticmethod
+    def _is_fresh(entry):
+        headers = entry['response']['headers']
+        cc = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-cache' in cc:
+            return False
+        age = time.time() - entry['stored_at']
+        try:
+            return age < int(cc['max-age'])
+        except (KeyError, ValueError):
+            pass
+        expires = _http_date(headers.get('Expires'))
+        date = _http_date(headers.get('Date'))
+        if expires is not None:
+            return age < expires - (date or entry['stored_at'])
+        return False
+
+    @staticmethod
+    def _is_cacheable(resp):
+        if resp.status_code != 200:
+            return False
+        headers = resp.headers
+        if headers.get('Vary', '').strip() == '*':
+            return False
+        cc = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in cc:
+            return False
+        return any(name in headers for name in
+                   ('ETag', 'Last-Modified', 'Expires')) or 'max-age' in cc
+
+    @staticmethod
+    def _conditional(request, entry):
+        headers = entry['response']['headers']
+        request = request.copy()
+        if 'ETag' in headers:
+            request.headers['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            request.headers['If-Modified-Since'] = headers['Last-Modified']
+        return request
+
+    @staticmethod
+    def _make_entry(key, request, resp):
+        state = resp.__getstate__()
+        vary = {}
+        for name in resp.headers.get('Vary', '').split(','):
+            name = name.strip()
+            if name:
+                vary[name] = request.headers.get(name)
+        return {
+            'key': key,
+            'response': {name: state[name] for name in _STORED_ATTRS},
+            'vary': vary,
+            'stored_at': time.time(),
+        }
+
+    @staticmethod
+    def _refresh(entry, not_modified):
+        stored = entry['response']
+        headers = CaseInsensitiveDict(stored['headers'])
+        for name in _REFRESHED_HEADERS:
+            if name in not_modified.headers:
+                headers[name] = not_modified.headers[name]
+        response = dict(stored, headers=headers)
+        return dict(entry, response=response, stored_at=time.time())
+
+    def _rebuild(self, entry, request):
+        response = Response()
+        response.__setstate__(dict(entry['response'], history=[],
+                                   request=request))
+        response.headers = CaseInsensitiveDict(response.headers)
+        response.connection = self
+        response.from_cache = True
+        return response
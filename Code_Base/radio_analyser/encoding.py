@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.encoding
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Charset resolution for JSON bodies served without a ``charset`` parameter.
+
+When ``Response.json()`` cannot decode a body as UTF-8/16/32 it falls back to
+``Response.text``, which runs ``charset_normalizer`` over every encoding it
+knows about. The helpers here reach the same answer, can restrict the
+search to a candidate list, and can remember the answer per host. Calling
+:func:`radio_analyser.mess.enable` makes that detection, and
+``Response.apparent_encoding`` with it, several times faster.
+"""
+
+import json
+import threading
+
+from requests.utils import guess_json_utf, urlparse
+
+#: Codecs emitted by every firmware seen so far, for use as ``candidates``.
+#: Restricting detection to them is cheaper still, but may not give the
+#: answer ``Response.apparent_encoding`` would.
+DEVICE_ENCODINGS = ('utf_8', 'cp1252', 'iso8859_15', 'latin_1')
+
+
+def _utf_encoding(content):
+    """Return the UTF codec ``content`` decodes cleanly with, if any."""
+    encoding = guess_json_utf(content) if len(content) > 3 else 'utf-8'
+    if encoding is None:
+        return None
+    try:
+        content.decode(encoding)
+    except UnicodeDecodeError:
+        return None
+    return encoding
+
+
+def detect_json_encoding(content, candidates=None):
+    """Return the codec ``content`` should be decoded with.
+
+    RFC 8259 JSON is detected from its first bytes, as ``Response.json()``
+    does. Anything else gets the codec ``Response.apparent_encoding`` would
+    pick.
+
+    :param content: the raw body.
+    :param candidates: (optional) codecs to restrict detection to for
+        non-UTF bodies, such as :data:`DEVICE_ENCODINGS`.
+    :rtype: str
+    """
+    encoding = _utf_encoding(content)
+    if encoding is not None:
+        return encoding
+
+    # Imported here so that radio_analyser.lazy can keep charset_normalizer
+    # unloaded until a body actually needs detecting.
+    from charset_normalizer import from_bytes
+    best = from_bytes(content,
+                      cp_isolation=list(candidates) if candidates else None)
+    best = best.best()
+    if best is not None:
+        return best.encoding
+    # What Response.text falls back to when nothing is detected.
+    return 'utf-8'
+
+
+class EncodingCache(object):
+    """Remembers the codec each host serves its JSON in.
+
+    UTF bodies are always recognised from their first bytes. The first
+    non-UTF body seen from a host pays for detection; later ones from that
+    host are decoded straight away and only re-detected if the remembered
+    codec stops working. A body is therefore decoded with what its host sent
+    before, even where detection on it alone would have picked another
+    codec. Safe to share between threads.
+
+    :param candidates: (optional) codecs to restrict detection to for
+        non-UTF bodies.
+    """
+
+    def __init__(self, candidates=None):
+        self.candidates = tuple(candidates) if candidates else None
+        self._encodings = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            return self._encodings.get(host)
+
+    def clear(self):
+        with self._lock:
+            self._encodings.clear()
+
+    def decode(self, host, content):
+        """Decode ``content`` received from ``host``.
+
+        :rtype: str
+        """
+        encoding = _utf_encoding(content)
+        if encoding is not None:
+            return content.decode(encoding)
+
+        encoding = self.get(host)
+        if encoding is not None:
+            try:
+                return content.decode(encoding)
+            except UnicodeDecodeError:
+                pass
+
+        encoding = detect_json_encoding(content, self.candidates)
+        with self._lock:
+            self._encodings[host] = encoding
+        return content.decode(encoding, errors='replace')
+
+
+def load_json(response, cache=None, **kwargs):
+    """Decode the JSON body of ``response`` without full charset sniffing.
+
+    A drop-in replacement for ``response.json()``, decoding the same way: an
+    explicit ``response.encoding`` is honoured, otherwise the codec is
+    resolved with :func:`detect_json_encoding`, or through ``cache`` when
+    given.
+
+    :param response: the :class:`requests.Response` to decode.
+    :param cache: (optional) an :class:`EncodingCache` shared between calls.
+    :param \\*\\*kwargs: optional arguments that ``json.loads`` takes.
+    :raises json.JSONDecodeError: if the body is not valid JSON.
+    """
+    content = response.content
+    if response.encoding:
+        return json.loads(content.decode(response.encoding, errors='replace'),
+                          **kwargs)
+
+    if cache is not None:
+        text = cache.decode(urlparse(response.url or '').netloc, content)
+    else:
+        encoding = detect_json_encoding(content)
+        text = content.decode(encoding, errors='replace')
+    return json.loads(text, **kwargs)
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.health
+~~~~~~~~~~~~~~~~~~~~~
+
+Per-host health tracking: retry budgets and circuit breakers.
+
+Radios regularly drop offline for hours. Retrying them with urllib3's
+``Retry`` makes every caller sit through connect timeouts and backoff sleeps
+for a host that is known to be down, holding workers and pool slots that
+healthy devices need. A :class:`HealthTracker` shared by all callers keeps,
+for each ``(scheme, host, port)``:
+
+* a circuit breaker: after ``failure_threshold`` consecutive failures the
+  circuit *opens* and requests fail at once without opening a socket; after
+  ``recovery_timeout`` it goes *half-open* and lets a single probe through,
+  whose outcome closes or re-opens it;
+* a retry budget: every request deposits ``budget_ratio`` of a retry token
+  and every retry spends one, so retries stay a bounded fraction of traffic
+  however many callers hit the host;
+* jittered exponential backoff that honours ``Retry-After``.
+
+:class:`CircuitBreakerAdapter` applies a tracker to every request it sends.
+"""
+
+import random
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+
+from .batch import host_key
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+#: Response codes treated as the host being unhealthy.
+FAILURE_STATUSES = frozenset([429, 502, 503, 504])
+
+
+class CircuitOpenError(ConnectionError):
+    """The circuit for the host is open; no request was sent."""
+
+
+class HostHealth(object):
+    """Health of a single host. Only read it through a tracker's lock."""
+
+    __slots__ = ('state', 'failures', 'opened_at', 'retry_at', 'probing',
+                 'tokens', 'requests', 'total_failures', 'rejected',
+                 'retries')
+
+    def __init__(self, initial_tokens):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.retry_at = None
+        self.probing = False
+        self.tokens = initial_tokens
+        self.requests = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class HealthTracker(object):
+    """Thread-safe health of every host a set of adapters talks to.
+
+    :param failure_threshold: (optional) consecutive failures that open
+        the circuit.
+    :param recovery_timeout: (optional) seconds an open circuit waits
+        before allowing a probe.
+    :param budget_ratio: (optional) retry tokens earned per request.
+    :param budget_max: (optional) cap on saved-up retry tokens; also the
+        initial balance.
+    :param backoff_factor: (optional) base of the exponential backoff.
+    :param backoff_max: (optional) longest single backoff sleep.
+    :param clock: (optional) monotonic clock, replaceable in tests.
+
+    Pickling keeps the settings but not the health of the hosts, whose
+    timestamps only mean something to the process that took them.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0,
+                 budget_ratio=0.2, budget_max=10.0, backoff_factor=0.5,
+                 backoff_max=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_hosts'], state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        health = self._hosts.get(key)
+        if health is None:
+            health = self._hosts[key] = HostHealth(self.budget_max)
+        return health
+
+    def before_request(self, key):
+        """Admit a request to ``key`` or raise :class:`CircuitOpenError`."""
+        with self._lock:
+            health = self._get(key)
+            now = self.clock()
+            if health.state == OPEN:
+                if now - health.opened_at < self.recovery_timeout:
+                    health.rejected += 1
+                    raise CircuitOpenError(
+                        'Circuit open for %s://%s:%s' % key)
+                health.state = HALF_OPEN
+                health.probing = False
+            if health.state == HALF_OPEN:
+                if health.probing:
+                    health.rejected += 1
+                    raise CircuitOpenError(
+                        'Circuit half-open for %s://%s:%s, probe in flight'
+                        % key)
+                health.probing = True
+            health.requests += 1
+            health.tokens = min(self.budget_max,
+                                health.tokens + self.budget_ratio)
+
+    def record_success(self, key):
+        with self._lock:
+            health = self._get(key)
+            health.state = CLOSED
+            health.failures = 0
+            health.opened_at = None
+            health.retry_at = None
+            health.probing = False
+
+    def record_failure(self, key, retry_after=None):
+        """Count a failure, opening the circuit if the threshold is hit.
+
+        :param retry_after: (optional) seconds the server asked us to wait.
+        """
+        with self._lock:
+            health = self._get(key)
+            now = self.clock()
+            health.failures += 1
+            health.total_failures += 1
+            health.probing = False
+            if retry_after is not None:
+                health.retry_at = now + retry_after
+            if (health.state == HALF_OPEN
+                    or health.failures >= self.failure_threshold):
+                health.state = OPEN
+                health.opened_at = now
+
+    def release(self, key):
+        """Give back an admitted request that neither succeeded nor failed.
+
+        Frees the half-open probe slot it may hold without counting a
+        failure against the host.
+        """
+        with self._lock:
+            health = self._hosts.get(key)
+            if health is not None:
+                health.probing = False
+
+    def acquire_retry(self, key):
+        """Spend a retry token for ``key``; ``False`` if none may be spent."""
+        with self._lock:
+            health = self._get(key)
+            if health.state != CLOSED or health.tokens < 1:
+                return False
+            health.tokens -= 1
+            health.retries += 1
+            return True
+
+    def backoff(self, key, attempt):
+        """Seconds to wait before retry number ``attempt`` (from 1).
+
+        Full jitter over an exponential ceiling, but never less than what a
+        ``Retry-After`` from the host still asks for.
+        """
+        ceiling = min(self.backoff_max,
+                      self.backoff_factor * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        with self._lock:
+            retry_at = self._get(key).retry_at
+        if retry_at is not None:
+            delay = max(delay, retry_at - self.clock())
+        return max(0.0, delay)
+
+    def state(self, key):
+        with self._lock:
+            health = self._hosts.get(key)
+            return health.state if health is not None else CLOSED
+
+    def snapshot(self):
+        """Return ``{(scheme, host, port): {...}}`` for monitoring.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {key: h.as_dict() for key, h in self._hosts.items()}
+
+    def reset(self, key=None):
+        """Forget the health of ``key``, or of every host."""
+        with self._lock:
+            if key is None:
+                self._hosts.clear()
+            else:
+                self._hosts.pop(key, None)
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return Retry().parse_retry_after(value)
+    except InvalidHeader:
+        return None
+
+
+def _is_resendable(request):
+    return request.body is None or isinstance(request.body, (bytes, str))
+
+
+class CircuitBreakerAdapter(HTTPAdapter):
+    """An :class:`~requests.adapters.HTTPAdapter` guarded by a
+    :class:`HealthTracker`.
+
+    Usage::
+
+      >>> import requests
+      >>> from radio_analyser.health import CircuitBreakerAdapter
+      >>> adapter = CircuitBreakerAdapter(retries=2)
+      >>> s = requests.Session()
+      >>> s.mount('http://', adapter)
+      >>> adapter.tracker.snapshot()
+
+    Connection errors, timeouts and responses in :data:`FAILURE_STATUSES`
+    count as failures. Retries happen here rather than in urllib3, so
+    ``max_retries`` defaults to none; each one must be paid for from the
+    host's retry budget, and none are made once the circuit has opened.
+    As with urllib3's ``Retry``, only idempotent methods are retried unless
+    ``allowed_methods`` says otherwise.
+
+    :param tracker: (optional) a :class:`HealthTracker`, shareable between
+        adapters. A new one is created if omitted.
+    :param retries: (optional) retries per request at most.
+    :param allowed_methods: (optional) upper-case methods that may be
+        retried, or ``None`` to retry any method.
+    :param \\*\\*kwargs: optional arguments that ``HTTPAdapter`` takes.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['tracker', 'retries',
+                                         'allowed_methods']
+
+    def __init__(self, tracker=None, retries=2,
+                 allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, **kwargs):
+        self.tracker = tracker if tracker is not None else HealthTracker()
+        self.retries = retries
+        self.allowed_methods = allowed_methods
+        kwargs.setdefault('max_retries', 0)
+        super(CircuitBreakerAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        """Sends PreparedRequest object, failing fast for unhealthy hosts.
+
+        Takes the same arguments as :meth:`HTTPAdapter.send`.
+
+        :raises CircuitOpenError: if the host's circuit is open.
+        :rtype: requests.Response
+        """
+        key = host_key(request.url)
+        tracker = self.tracker
+        attempt = 0
+        while True:
+            tracker.before_request(key)
+            try:
+                resp = super(CircuitBreakerAdapter, self).send(
+                    request, **kwargs)
+            except (ConnectionError, Timeout):
+                tracker.record_failure(key)
+                delay = self._retry_delay(key, request, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                # Not the host's doing (bad arguments, an interrupt, ...),
+                # but the probe slot must not stay taken.
+                tracker.release(key)
+                raise
+            else:
+                if resp.status_code not in FAILURE_STATUSES:
+                    tracker.record_success(key)
+                    return resp
+                tracker.record_failure(key, _retry_after(resp))
+                delay = self._retry_delay(key, request, attempt)
+                if delay is None:
+                    return resp
+                # Reading the body hands the connection back to the pool;
+                # closing the response would close the socket instead.
+                resp.content
+            attempt += 1
+            time.sleep(delay)
+
+    def _retry_delay(self, key, request, attempt):
+        """Seconds to sleep before retrying, or ``None`` not to retry."""
+        if attempt >= self.retries or not _is_resendable(request):
+            return None
+        if (self.allowed_methods is not None
+                and request.method.upper() not in self.allowed_methods):
+            return None
+        delay = self.tracker.backoff(key, attempt + 1)
+        # A host asking for a longer pause than we would ever back off is
+        # better reported to the caller than slept on.
+        if delay > self.tracker.backoff_max:
+            return None
+        if not self.tracker.acquire_retry(key):
+            return None
+        return delay
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.instrumentation
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Timing of the connection-pool and request lifecycle.
+
+:class:`InstrumentedHTTPAdapter` builds its pools from subclasses of the
+urllib3 pool, connection and response classes that report:
+
+* ``pool_wait`` -- time spent in ``HTTPConnectionPool._get_conn``;
+* ``connect`` -- TCP connection set-up;
+* ``tls_handshake`` -- TLS set-up on top of the TCP connection;
+* ``ttfb`` -- from sending the request to having the response headers;
+* ``body_read`` -- time spent reading the body;
+
+and counts ``requests``, ``new_connections``, ``reused_connections`` and
+``discarded_connections``. Events go to an :class:`Instrumentation`, which
+keeps per-pool histograms and forwards them to any subscribed callbacks.
+With statistics off and nobody subscribed, every hook reduces to a single
+attribute check.
+"""
+
+import bisect
+import threading
+from timeit import default_timer
+
+from requests.adapters import DEFAULT_POOLBLOCK, HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import PoolManager
+from urllib3.response import HTTPResponse
+
+TIMINGS = ('pool_wait', 'connect', 'tls_handshake', 'ttfb', 'body_read')
+COUNTERS = ('requests', 'new_connections', 'reused_connections',
+            'discarded_connections')
+
+#: Upper bounds, in seconds, of the histogram buckets. A final bucket
+#: collects everything slower.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """Fixed-bucket histogram of durations in seconds."""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, pct):
+        """Return the bucket bound below which ``pct`` percent of values lie.
+
+        Values past the last bucket report the maximum seen.
+        """
+        if not self.count:
+            return None
+        target = self.count * pct / 100.0
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class PoolStats(object):
+    """Histograms and counters for a single connection pool."""
+
+    def __init__(self):
+        self.timings = {name: Histogram() for name in TIMINGS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def as_dict(self):
+        result = {name: h.as_dict() for name, h in self.timings.items()}
+        result.update(self.counters)
+        return result
+
+
+class Instrumentation(object):
+    """Collects lifecycle events from instrumented pools.
+
+    Callbacks are called as ``callback(event, pool_key, value)`` from the
+    thread doing the work, where ``pool_key`` is ``(scheme, host, port)``
+    and ``value`` is a duration in seconds for timings or ``1`` for
+    counters. They should return quickly; exceptions they raise propagate
+    into the request.
+
+    :param collect_stats: (optional) whether to keep per-pool histograms.
+    """
+
+    def __init__(self, collect_stats=True):
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._callbacks = ()
+        self.collect_stats = collect_stats
+        self._update()
+
+    def _update(self):
+        #: Checked by every hook before it reads the clock.
+        self.enabled = bool(self.collect_stats or self._callbacks)
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._callbacks = self._callbacks + (callback,)
+            self._update()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._callbacks = tuple(c for c in self._callbacks
+                                    if c is not callback)
+            self._update()
+
+    def set_collect_stats(self, value):
+        with self._lock:
+            self.collect_stats = value
+            self._update()
+
+    def record(self, event, pool_key, value=1):
+        if self.collect_stats:
+            with self._lock:
+                stats = self._pools.get(pool_key)
+                if stats is None:
+                    stats = self._pools[pool_key] = PoolStats()
+                if event in stats.counters:
+                    stats.counters[event] += value
+                else:
+                    stats.timings[event].add(value)
+        for callback in self._callbacks:
+            callback(event, pool_key, value)
+
+    def stats(self, pool_key=None):
+        """Return a snapshot of the collected statistics.
+
+        :param pool_key: (optional) a ``(scheme, host, port)`` triple to
+            restrict the snapshot to.
+        :rtype: dict
+        """
+        with self._lock:
+            if pool_key is not None:
+                stats = self._pools.get(pool_key)
+                return stats.as_dict() if stats is not None else None
+            return {key: s.as_dict() for key, s in self._pools.items()}
+
+    def reset(self):
+        with self._lock:
+            self._pools.clear()
+
+
+class _ConnectionMixin(object):
+    #: Set by the pool that creates the connection.
+    instrumentation = None
+    pool_key = None
+    #: Seconds spent connecting since the pool last cleared it.
+    connect_time = 0.0
+
+    def _new_conn(self):
+        inst = self.instrumentation
+        if inst is None or not inst.enabled:
+            return super(_ConnectionMixin, self)._new_conn()
+        start = default_timer()
+        sock = super(_ConnectionMixin, self)._new_conn()
+        elapsed = default_timer() - start
+        self.connect_time += elapsed
+        inst.record('connect', self.pool_key, elapsed)
+        # Counted here rather than in the pool: a pooled connection whose
+        # socket was dropped opens a new one without a new connection object.
+        inst.record('new_connections', self.pool_key)
+        return sock
+
+
+class InstrumentedHTTPConnection(_ConnectionMixin, HTTPConnection):
+    pass
+
+
+class InstrumentedHTTPSConnection(_ConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        inst = self.instrumentation
+        if inst is None or not inst.enabled:
+            return super(InstrumentedHTTPSConnection, self).connect()
+        before = self.connect_time
+        start = default_timer()
+        super(InstrumentedHTTPSConnection, self).connect()
+        elapsed = default_timer() - start
+        inst.record('tls_handshake', self.pool_key,
+                    max(0.0, elapsed - (self.connect_time - before)))
+        self.connect_time = before + elapsed
+
+
+class InstrumentedHTTPResponse(HTTPResponse):
+    """Accumulates the time spent reading the body until it is released."""
+
+    _read_time = 0.0
+    #: Set while a read is being timed.
+    _reading = False
+    #: Set when the connection was released and ``body_read`` not yet sent.
+    _released = False
+
+    def _instrumentation(self):
+        inst = getattr(self._pool, 'instrumentation', None)
+        if inst is not None and inst.enabled:
+            return inst
+        return None
+
+    def read(self, amt=None, decode_content=None, cache_content=False):
+        if self._instrumentation() is None:
+            return super(InstrumentedHTTPResponse, self).read(
+                amt, decode_content, cache_content)
+        self._reading = True
+        start = default_timer()
+        try:
+            return super(InstrumentedHTTPResponse, self).read(
+                amt, decode_content, cache_content)
+        finally:
+            self._read_time += default_timer() - start
+            self._reading = False
+            self._record_body_read()
+
+    def read_chunked(self, amt=None, decode_content=None):
+        if self._instrumentation() is None:
+            for chunk in super(InstrumentedHTTPResponse, self).read_chunked(
+                    amt, decode_content):
+                yield chunk
+            return
+        chunks = super(InstrumentedHTTPResponse, self).read_chunked(
+            amt, decode_content)
+        while True:
+            self._reading = True
+            start = default_timer()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self._read_time += default_timer() - start
+                self._reading = False
+                self._record_body_read()
+            yield chunk
+
+    def release_conn(self):
+        if self._pool and self._connection:
+            self._released = True
+            # The last read releases the connection before its own time has
+            # been added; it reports once it has.
+            if not self._reading:
+                self._record_body_read()
+        super(InstrumentedHTTPResponse, self).release_conn()
+
+    def _record_body_read(self):
+        if not self._released:
+            return
+        self._released = False
+        inst = self._instrumentation()
+        if inst is not None:
+            inst.record('body_read', self._pool.pool_key, self._read_time)
+
+
+class _PoolMixin(object):
+    #: Set by :class:`InstrumentedPoolManager` once the pool is created.
+    instrumentation = None
+    ResponseCls = InstrumentedHTTPResponse
+
+    @property
+    def pool_key(self):
+        return self.scheme, self.host, self.port
+
+    def _new_conn(self):
+        conn = super(_PoolMixin, self)._new_conn()
+        conn.instrumentation = self.instrumentation
+        conn.pool_key = self.pool_key
+        return conn
+
+    def _get_conn(self, timeout=None):
+        inst = self.instrumentation
+        if inst is None or not inst.enabled:
+            return super(_PoolMixin, self)._get_conn(timeout)
+        start = default_timer()
+        conn = super(_PoolMixin, self)._get_conn(timeout)
+        inst.record('pool_wait', self.pool_key, default_timer() - start)
+        if getattr(conn, 'sock', None) is not None:
+            inst.record('reused_connections', self.pool_key)
+        return conn
+
+    def _put_conn(self, conn):
+        inst = self.instrumentation
+        if inst is None or not inst.enabled:
+            return super(_PoolMixin, self)._put_conn(conn)
+        had_sock = getattr(conn, 'sock', None) is not None
+        super(_PoolMixin, self)._put_conn(conn)
+        if had_sock and getattr(conn, 'sock', None) is None:
+            inst.record('discarded_connections', self.pool_key)
+
+    def _make_request(self, conn, method, url, **kwargs):
+        inst = self.instrumentation
+        if inst is None or not inst.enabled:
+            return super(_PoolMixin, self)._make_request(
+                conn, method, url, **kwargs)
+        inst.record('requests', self.pool_key)
+        conn.connect_time = 0.0
+        start = default_timer()
+        response = super(_PoolMixin, self)._make_request(
+            conn, method, url, **kwargs)
+        # Plain HTTP connections are opened lazily inside the request; that
+        # time has been reported as ``connect`` already.
+        elapsed = default_timer() - start - conn.connect_time
+        inst.record('ttfb', self.pool_key, max(0.0, elapsed))
+        return response
+
+
+class InstrumentedHTTPConnectionPool(_PoolMixin, HTTPConnectionPool):
+    ConnectionCls = InstrumentedHTTPConnection
+
+
+class InstrumentedHTTPSConnectionPool(_PoolMixin, HTTPSConnectionPool):
+    ConnectionCls = InstrumentedHTTPSConnection
+
+
+class InstrumentedPoolManager(PoolManager):
+    """A :class:`~urllib3.poolmanager.PoolManager` whose pools report to
+    ``instrumentation``."""
+
+    def __init__(self, instrumentation, *args, **kwargs):
+        super(InstrumentedPoolManager, self).__init__(*args, **kwargs)
+        self.instrumentation = instrumentation
+        self.pool_classes_by_scheme = {
+            'http': InstrumentedHTTPConnectionPool,
+            'https': InstrumentedHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super(InstrumentedPoolManager, self)._new_pool(
+            scheme, host, port, request_context)
+        pool.instrumentation = self.instrumentation
+        return pool
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """An :class:`~requests.adapters.HTTPAdapter` reporting pool lifecycle
+    timings.
+
+    Usage::
+
+      >>> import requests
+      >>> from radio_analyser.instrumentation import InstrumentedHTTPAdapter
+      >>> adapter = InstrumentedHTTPAdapter()
+      >>> s = requests.Session()
+      >>> s.mount('http://', adapter)
+      >>> s.get('http://radio.local/status.json')
+      >>> adapter.instrumentation.stats()
+
+    Requests sent through a proxy are not instrumented.
+
+    :param instrumentation: (optional) an :class:`Instrumentation` to report
+        to, shareable between adapters. A new one is created if omitted.
+    :param \\*\\*kwargs: optional arguments that ``HTTPAdapter`` takes.
+    """
+
+    def __init__(self, instrumentation=None, **kwargs):
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
+        super(InstrumentedHTTPAdapter, self).__init__(**kwargs)
+
+    def __setstate__(self, state):
+        self.instrumentation = Instrumentation()
+        super(InstrumentedHTTPAdapter, self).__setstate__(state)
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK,
+                         **pool_kwargs):
+        # save these values for pickling
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = InstrumentedPoolManager(
+            self.instrumentation, num_pools=connections, maxsize=maxsize,
+            block=block, strict=True, **pool_kwargs)
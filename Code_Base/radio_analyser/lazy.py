@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.lazy
+~~~~~~~~~~~~~~~~~~~
+
+Deferred loading of the heavy modules ``import requests`` pulls in.
+
+requests imports ``charset_normalizer`` (with its frequency tables and
+mess detectors) and ``idna`` (with its codepoint tables) at import time,
+although a scraper talking to ASCII hosts that declare their charsets never
+uses either. :func:`enable` registers placeholder modules for them so that
+their code only runs the first time one of their attributes is used: charset
+detection when ``Response.apparent_encoding`` is needed, IDNA when a
+non-ASCII host name is encoded.
+
+It has to run before ``requests`` is first imported; setting
+``RADIO_ANALYSER_LAZY_IMPORTS=1`` in the environment makes importing
+:mod:`radio_analyser` do it.
+"""
+
+import importlib.util
+import os
+import re
+import sys
+import threading
+import types
+
+#: Modules deferred by :func:`enable`, with the file each one's
+#: ``__version__`` is read from (requests checks it at import time).
+LAZY_MODULES = {
+    'charset_normalizer': 'version.py',
+    'idna': 'package_data.py',
+}
+
+_VERSION_RE = re.compile(r'''^__version__\s*=\s*['"]([^'"]+)['"]''', re.M)
+_lock = threading.RLock()
+#: Names of the placeholders whose code is running, guarded by ``_lock``.
+_loading = set()
+
+
+class _LazyModule(types.ModuleType):
+    """A module whose code runs on the first lookup of a missing attribute.
+
+    Attributes placed on it up front (``__path__``, ``__version__``, ...)
+    are served without loading, so ``import pkg.sub`` and version checks
+    stay cheap. Other threads looking up a missing attribute while the code
+    runs wait for it to finish.
+    """
+
+    def __getattr__(self, name):
+        with _lock:
+            if type(self) is _LazyModule and self.__name__ not in _loading:
+                # Lookups the code itself makes while it runs fall through
+                # to the plain dictionary lookup below.
+                _loading.add(self.__name__)
+                try:
+                    self.__spec__.loader.exec_module(self)
+                finally:
+                    _loading.discard(self.__name__)
+                # Only once the code has run may lookups stop coming here.
+                self.__class__ = types.ModuleType
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError('module %r has no attribute %r'
+                                 % (self.__name__, name))
+
+
+def _read_version(spec, filename):
+    if not spec.submodule_search_locations:
+        return None
+    for location in spec.submodule_search_locations:
+        try:
+            with open(os.path.join(location, filename)) as f:
+                match = _VERSION_RE.search(f.read())
+        except OSError:
+            continue
+        if match:
+            return match.group(1)
+    return None
+
+
+def defer(name, version_file=None):
+    """Register ``name`` in ``sys.modules`` without running its code.
+
+    :returns: ``True`` if a placeholder was installed, ``False`` if the
+        module was already imported or cannot be found.
+    """
+    with _lock:
+        if name in sys.modules:
+            return False
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            return False
+        module = importlib.util.module_from_spec(spec)
+        if version_file:
+            version = _read_version(spec, version_file)
+            if version is not None:
+                module.__version__ = version
+        module.__class__ = _LazyModule
+        sys.modules[name] = module
+        return True
+
+
+def is_loaded(name):
+    """Whether ``name`` has been imported and its code has run."""
+    module = sys.modules.get(name)
+    return module is not None and type(module) is not _LazyModule
+
+
+def enable():
+    """Defer every module in :data:`LAZY_MODULES`.
+
+    :returns: the names actually deferred; modules that were already
+        imported are left alone.
+    :rtype: list
+    """
+    return [name for name, version_file in LAZY_MODULES.items()
+            if defer(name, version_file)]
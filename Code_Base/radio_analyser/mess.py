@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.mess
+~~~~~~~~~~~~~~~~~~~
+
+A batched engine for ``charset_normalizer.md.mess_ratio``.
+
+``mess_ratio`` builds one instance of every ``MessDetectorPlugin`` and feeds
+each decoded character to each of them in turn, paying for a method call and
+an ``lru_cache`` lookup per character per plugin. ``from_bytes`` repeats that
+for every chunk of every candidate codec, which is what makes
+``Response.apparent_encoding`` slow.
+
+:func:`mess_ratio` here computes the same value from whole-chunk operations.
+Each code point is classified once, with charset_normalizer's own
+predicates, and interned by its *signature*: the class every plugin puts it
+in. Unicode has only a few dozen distinct signatures, so a chunk is turned
+into one byte per character with a single ``str.translate``; every plugin
+then reads its counters off that byte string with ``bytes.translate``,
+``bytes.count`` and regular expressions, at the same checkpoints where the
+original sums the plugin ratios.
+
+:func:`enable` makes ``charset_normalizer.from_bytes`` use it. This is
+process-wide and left to the application to opt into; :func:`disable`
+restores the original.
+"""
+
+import re
+import threading
+from functools import lru_cache
+
+from charset_normalizer.constant import UNICODE_RANGES_COMBINED
+from charset_normalizer.md import (MessDetectorPlugin,
+                                   is_suspiciously_successive_range)
+from charset_normalizer.utils import (
+    is_accentuated, is_ascii, is_case_variable, is_cjk, is_emoticon,
+    is_hangul, is_hiragana, is_katakana, is_latin, is_punctuation,
+    is_separator, is_symbol, is_thai, remove_accent, unicode_range,
+)
+
+#: The plugins reproduced here, in the order ``mess_ratio`` sums them.
+PLUGINS = (
+    'TooManySymbolOrPunctuationPlugin',
+    'TooManyAccentuatedPlugin',
+    'UnprintablePlugin',
+    'SuspiciousDuplicateAccentPlugin',
+    'SuspiciousRange',
+    'SuperWeirdWordPlugin',
+    'CjkInvalidStopPlugin',
+    'ArchaicUpperLowerPlugin',
+)
+
+# Characters that TooManySymbolOrPunctuationPlugin and SuspiciousRange
+# leave out of their punctuation checks.
+_MARKUP = frozenset('<>=:/&;{}[],|"-')
+
+# Fields of a signature, one per view of a chunk, with their alphabets.
+_FIELDS = (
+    'printable',    # '1' printable, '0' not
+    'punctuation',  # weight in the symbol ratio: '1' punctuation, '2' symbol
+    'alpha',        # '0' other, '1'/'2' letter, '3'/'4' Latin letter;
+                    # even if accentuated
+    'unprintable',  # '1' counted by UnprintablePlugin
+    'word',         # letters 'a', 'b' accentuated, 'f' foreign, 'g' both;
+                    # 's' ends a word, 'y' spoils it, 'o' is skipped
+    'cjk',          # '1' invalid stop, '2' other CJK
+    'archaic',      # 'c' cased letter, 'd' digit, 'x' other; upper case
+                    # when not ASCII
+    'case',         # 'U' upper, 'L' lower, '.' neither
+)
+
+# Range of each printable character, for SuspiciousRange.
+_RANGE_RESET = '\x00'
+_RANGE_NONE = '\x01'
+_RANGE_HIDDEN = '\x02'
+# Ranges named after Latin get their own block: two of them side by side are
+# never suspicious.
+_RANGE_IDS = {name: chr((0x1000 if 'Latin' in name else 0x100) + i)
+              for i, name in enumerate(UNICODE_RANGES_COMBINED)}
+_RANGE_NAMES = {code: name for name, code in _RANGE_IDS.items()}
+
+# Code point -> signature id, and -> signature id followed by range.
+_CLASS = {}
+_CLASS_RANGE = {}
+_known = set()
+_signatures = {}
+# Field -> 256-byte table from signature id to the field's class.
+_views = {}
+_lock = threading.Lock()
+
+_suspicious = {}
+
+_REPEAT = re.compile(r'(.)\1+', re.S)
+_HIDDEN_RUN = re.compile(b'0+')
+_ACCENT_PAIR = re.compile(b'4(?=[012]*(4))')
+# Neighbouring ranges that differ, other than two Latin ones, or that are
+# both unknown.
+_RANGE_CHANGE = re.compile(
+    u'(?=([^\x00\u1000-\u1fff])(?!\\1)[^\x00]'
+    u'|[\u1000-\u1fff][^\x00\u1000-\u1fff]|\x01\x01)')
+_WORD_END = re.compile(b'[abfg][abfgyo]*s')
+# Words that may be bad: two accentuated letters or more, or long ones.
+_MARKED_WORD = re.compile(
+    b'(?<![abfg])(?:[af]*[bg][af]*[bg][abfg]*|[abfg]{24,})s')
+_PLAIN_LETTERS = bytes.maketrans(b'bfg', b'aaa')
+_NON_ASCII_CASE = re.compile(b'[CDX]')
+_CASE_RUN = re.compile(b'.[cC]*[dDxX]?', re.S)
+_LONG_CASE_STREAK = re.compile(b'ULU|LUL')
+_CASE_STREAK = re.compile(b'(?:UL)+U?|(?:LU)+L?')
+
+
+def _signature(character):
+    """Return the class of ``character`` for every field, and its range."""
+    printable = character.isprintable()
+    alpha = character.isalpha()
+    space = character.isspace()
+    digit = character.isdigit()
+    punctuation = is_punctuation(character)
+
+    if not printable or character in _MARKUP:
+        weight = '0'
+    elif punctuation:
+        weight = '1'
+    elif not digit and is_symbol(character) and not is_emoticon(character):
+        weight = '2'
+    else:
+        weight = '0'
+
+    latin = accentuated = False
+    if alpha:
+        latin = is_latin(character)
+        accentuated = is_accentuated(character)
+        foreign = not (latin or is_cjk(character) or is_hangul(character)
+                       or is_katakana(character) or is_hiragana(character)
+                       or is_thai(character))
+        word = 'abfg'[2 * foreign + accentuated]
+    elif space or punctuation or is_separator(character):
+        word = 's'
+    elif character not in '<>-=' and not digit and is_symbol(character):
+        word = 'y'
+    else:
+        word = 'o'
+
+    if character in (u'丅', u'丄'):
+        cjk = '1'
+    else:
+        cjk = '2' if is_cjk(character) else '0'
+
+    if alpha and is_case_variable(character):
+        archaic = 'c'
+    else:
+        archaic = 'd' if digit else 'x'
+    if not is_ascii(character):
+        archaic = archaic.upper()
+
+    signature = (
+        '1' if printable else '0',
+        weight,
+        '01234'[alpha + 2 * latin + accentuated],
+        '1' if (character not in '\n\t\r\v' and not printable
+                and not space and ord(character) != 0x1A) else '0',
+        word,
+        cjk,
+        archaic,
+        'U' if character.isupper() else 'L' if character.islower() else '.',
+    )
+
+    if not printable:
+        character_range = _RANGE_HIDDEN
+    elif space or punctuation or character in _MARKUP:
+        character_range = _RANGE_RESET
+    else:
+        name = unicode_range(character)
+        character_range = _RANGE_NONE if name is None else _RANGE_IDS[name]
+    return signature, character_range
+
+
+def _learn(characters):
+    """Classify the code points of ``characters`` not seen yet.
+
+    :returns: ``False`` if one of them cannot be given a one-byte class.
+    """
+    global _views
+    with _lock:
+        for character in set(characters).difference(_known):
+            signature, character_range = _signature(character)
+            code = _signatures.get(signature)
+            if code is None:
+                if len(_signatures) == 256:
+                    return False
+                code = _signatures[signature] = len(_signatures)
+                # Publish the views before any character can map to the
+                # new class.
+                views = {}
+                for i, field in enumerate(_FIELDS):
+                    table = bytearray(256)
+                    for known, value in _signatures.items():
+                        table[value] = ord(known[i])
+                    views[field] = bytes(table)
+                _views = views
+            _CLASS[ord(character)] = chr(code)
+            _CLASS_RANGE[ord(character)] = chr(code) + character_range
+            _known.add(character)
+    return True
+
+
+# ASCII text is classified without checking for unknown characters.
+_learn(''.join(map(chr, range(128))))
+
+
+def _is_suspicious(pair):
+    try:
+        return _suspicious[pair]
+    except KeyError:
+        names = [_RANGE_NAMES.get(code) for code in pair]
+        result = _suspicious[pair] = is_suspiciously_successive_range(*names)
+        return result
+
+
+def _counts(view, value, bounds):
+    """Occurrences of ``value`` in each prefix ``view[:bound]``."""
+    counts = []
+    total = previous = 0
+    for bound in bounds:
+        total += view.count(value, previous, bound)
+        counts.append(total)
+        previous = bound
+    return counts
+
+
+def _sums(events, bounds):
+    """Total weight of the ``(position, weight)`` events below each bound."""
+    sums = []
+    total = i = 0
+    size = len(events)
+    for bound in bounds:
+        while i < size and events[i][0] < bound:
+            total += events[i][1]
+            i += 1
+        sums.append(total)
+    return sums
+
+
+def _classify(text):
+    """Translate ``text`` to its classes, followed by ranges unless ASCII.
+
+    :returns: ``None`` if a character cannot be classified.
+    """
+    if text.isascii():
+        return text.translate(_CLASS)
+    classified = text.translate(_CLASS_RANGE)
+    if len(classified) != 2 * len(text):
+        # Characters seen for the first time are left untranslated.
+        if not _learn(text):
+            return None
+        classified = text.translate(_CLASS_RANGE)
+    return classified
+
+
+class _Chunk(object):
+    """A decoded chunk, classified for every plugin."""
+
+    def __init__(self, text, classified, ends):
+        self.text = text
+        self.ends = ends
+        if len(classified) == len(text):
+            # All of ASCII is Basic Latin, so no range ever changes.
+            self.classes = classified.encode('latin-1')
+            self.ranges = None
+        else:
+            self.classes = classified[::2].encode('latin-1')
+            self.ranges = classified[1::2].replace(_RANGE_HIDDEN, '')
+        # Read after translating, so that every class is in the views.
+        self.views = _views
+        self.printable = self.view('printable')
+        self.shown_bounds = _counts(self.printable, b'1', ends)
+
+    def view(self, field):
+        return self.classes.translate(self.views[field])
+
+    def ratios(self):
+        """Return each plugin's ratios at every prefix length in ``ends``."""
+        return zip(
+            self.too_many_symbol_or_punctuation(),
+            self.too_many_accentuated(),
+            self.unprintable(),
+            self.suspicious_duplicate_accent(),
+            self.suspicious_range(),
+            self.super_weird_word(),
+            self.cjk_invalid_stop(),
+            self.archaic_upper_lower(),
+        )
+
+    def too_many_symbol_or_punctuation(self):
+        text, printable = self.text, self.printable
+        weights = self.view('punctuation')
+        # A character repeating the previous printable one is not weighed,
+        # even with unprintable ones in between.
+        repeats = []
+        for match in _REPEAT.finditer(text):
+            if printable[match.start()] == 0x31:
+                start = match.start() + 1
+                repeats.extend((i, weights[i] - 0x30)
+                               for i in range(start, match.end()))
+        for match in _HIDDEN_RUN.finditer(printable):
+            start, end = match.span()
+            if 0 < start and end < len(text) and text[start - 1] == text[end]:
+                repeats.append((end, weights[end] - 0x30))
+        repeats.sort()
+
+        ratios = []
+        for count, ones, twos, repeated in zip(
+                self.shown_bounds, _counts(weights, b'1', self.ends),
+                _counts(weights, b'2', self.ends),
+                _sums(repeats, self.ends)):
+            if count == 0:
+                ratios.append(0.0)
+                continue
+            ratio = (ones + 2 * twos - repeated) / count
+            ratios.append(ratio if ratio >= 0.3 else 0.0)
+        return ratios
+
+    def too_many_accentuated(self):
+        alpha = self.view('alpha')
+        ratios = []
+        for plain, accentuated, latin, latin_accentuated in zip(
+                *[_counts(alpha, c, self.ends) for c in (b'1', b'2', b'3',
+                                                         b'4')]):
+            count = plain + accentuated + latin + latin_accentuated
+            if count == 0:
+                ratios.append(0.0)
+                continue
+            ratio = (accentuated + latin_accentuated) / count
+            ratios.append(ratio if ratio >= 0.35 else 0.0)
+        return ratios
+
+    def unprintable(self):
+        unprintable = _counts(self.view('unprintable'), b'1', self.ends)
+        return [(count * 8) / end for count, end in zip(unprintable,
+                                                         self.ends)]
+
+    def suspicious_duplicate_accent(self):
+        alpha = self.view('alpha')
+        latin_bounds = _counts(alpha, b'3', self.ends)
+        latin_bounds = [count + accentuated for count, accentuated in zip(
+            latin_bounds, _counts(alpha, b'4', self.ends))]
+
+        # Accentuated Latin letters with only non-Latin characters between.
+        events = []
+        text = self.text
+        for match in _ACCENT_PAIR.finditer(alpha):
+            i = match.start(1)
+            last, character = text[match.start()], text[i]
+            weight = character.isupper() and last.isupper()
+            weight += remove_accent(character) == remove_accent(last)
+            if weight:
+                events.append((i, weight))
+        return [0.0 if count == 0 else (successive * 2) / count
+                for count, successive in zip(latin_bounds,
+                                             _sums(events, self.ends))]
+
+    def suspicious_range(self):
+        if self.ranges is None:
+            return [0.0] * len(self.ends)
+        ranges = self.ranges
+        events = []
+        for match in _RANGE_CHANGE.finditer(ranges):
+            i = match.start()
+            if _is_suspicious(ranges[i:i + 2]):
+                events.append((i + 1, 1))
+        ratios = []
+        for count, successive in zip(self.shown_bounds,
+                                     _sums(events, self.shown_bounds)):
+            if count == 0:
+                ratios.append(0.0)
+                continue
+            ratio = (successive * 2) / count
+            ratios.append(0.0 if ratio < 0.1 else ratio)
+        return ratios
+
+    def super_weird_word(self):
+        words = self.view('word')
+        if b'y' in words:
+            return self._super_weird_word_by_word(words)
+        # Without symbols a word is just a run of letters; with the skipped
+        # characters dropped, every 'as' in the plain view closes one.
+        letters = words.translate(None, b'o')
+        plain = letters.translate(_PLAIN_LETTERS)
+        bounds = [end - skipped for end, skipped in zip(
+            self.ends, _counts(words, b'o', self.ends))]
+        bad = []
+        for match in _MARKED_WORD.finditer(letters):
+            word = match.group()
+            size = len(word) - 1
+            accents = word.count(b'b') + word.count(b'g')
+            if ((size >= 4 and accents / size >= 0.3)
+                    or (size >= 24 and (b'f' in word or b'g' in word))):
+                bad.append((match.end() - 1, size))
+        ratios = []
+        for bound, bad_count in zip(bounds, _sums(bad, bounds)):
+            if plain.count(b'as', 0, bound) <= 10:
+                ratios.append(0.0)
+                continue
+            last = plain.rfind(b'as', 0, bound)
+            ratios.append(bad_count / plain.count(b'a', 0, last + 1))
+        return ratios
+
+    def _super_weird_word_by_word(self, view):
+        words, characters, bad = [], [], []
+        for match in _WORD_END.finditer(view):
+            word = match.group()
+            end = match.end() - 1
+            size = end - match.start() - word.count(b'o')
+            accents = word.count(b'b') + word.count(b'g')
+            words.append((end, 1))
+            characters.append((end, size))
+            if (b'y' in word
+                    or (size >= 4 and accents / size >= 0.3)
+                    or (size >= 24 and (b'f' in word or b'g' in word))):
+                bad.append((end, size))
+        return [0.0 if count <= 10 else bad_count / character_count
+                for count, character_count, bad_count in zip(
+                    _sums(words, self.ends), _sums(characters, self.ends),
+                    _sums(bad, self.ends))]
+
+    def cjk_invalid_stop(self):
+        cjk = self.view('cjk')
+        return [0.0 if count < 16 else wrong / count
+                for wrong, count in zip(_counts(cjk, b'1', self.ends),
+                                        _counts(cjk, b'2', self.ends))]
+
+    def archaic_upper_lower(self):
+        ends = self.ends
+        archaic = self.view('archaic')
+        case = self.view('case')
+        # Only runs holding a non-ASCII character and at least three
+        # alternating cases count.
+        if (not _NON_ASCII_CASE.search(archaic)
+                or not _LONG_CASE_STREAK.search(case)):
+            return [0.0] * len(ends)
+        events = []
+        # A run starts with any character, goes on with cased letters and
+        # is closed by the next character that is not one.
+        for match in _CASE_RUN.finditer(archaic):
+            start, end = match.span()
+            closer = end - 1
+            if (closer == start or archaic[closer] in b'cCdD'
+                    or closer - start > 64
+                    or not _NON_ASCII_CASE.search(archaic, start, closer)):
+                continue
+            successive = 0
+            for streak in _CASE_STREAK.findall(case, start, closer):
+                successive += 2 * ((len(streak) - 1) // 2)
+            if successive:
+                events.append((closer, successive))
+        return [final / end for final, end in zip(_sums(events, ends), ends)]
+
+
+@lru_cache(maxsize=2048)
+def mess_ratio(decoded_sequence, maximum_threshold=0.2, debug=False):
+    """Compute the mess ratio of a decoded chunk.
+
+    A drop-in replacement for ``charset_normalizer.md.mess_ratio``, returning
+    the same value. If plugins other than the built-in ones have been
+    registered, the call is handed to the original.
+
+    :param decoded_sequence: the decoded chunk.
+    :param maximum_threshold: (optional) ratio at which to stop early.
+    :param debug: (optional) print each plugin's ratio.
+    :rtype: float
+    """
+    if len(MessDetectorPlugin.__subclasses__()) != len(PLUGINS):
+        return _original(decoded_sequence, maximum_threshold, debug)
+
+    length = len(decoded_sequence)
+    if length < 512:
+        step = 32
+    elif length <= 1024:
+        step = 64
+    else:
+        step = 128
+    # Prefix lengths at which the original sums the ratios.
+    ends = list(range(step + 1, length, step))
+    if length:
+        ends.append(length)
+
+    # A chunk in the wrong codec usually crosses the threshold at the first
+    # checkpoint, so that one is tried on its own before the whole chunk.
+    mean_mess_ratio = 0.0
+    ratios = ()
+    done = 0
+    for window in (ends[:1], ends):
+        if len(window) == done:
+            continue
+        text = decoded_sequence[:window[-1]]
+        classified = _classify(text)
+        if classified is None:
+            return _original(decoded_sequence, maximum_threshold, debug)
+        for ratios in _Chunk(text, classified, window[done:]).ratios():
+            mean_mess_ratio = sum(ratios)
+            if mean_mess_ratio >= maximum_threshold:
+                break
+        else:
+            done = len(window)
+            continue
+        break
+
+    if debug:
+        for name, ratio in zip(PLUGINS, ratios):  # pragma: nocover
+            print(name, ratio)
+
+    return round(mean_mess_ratio, 3)
+
+
+def _original(decoded_sequence, maximum_threshold, debug):
+    from charset_normalizer import md
+    return md.mess_ratio(decoded_sequence, maximum_threshold, debug)
+
+
+def enable():
+    """Make ``charset_normalizer.from_bytes`` use :func:`mess_ratio`.
+
+    This affects every caller in the process, ``Response.apparent_encoding``
+    included; detection results are unchanged. Safe to call more than once.
+    """
+    from charset_normalizer import api
+    api.mess_ratio = mess_ratio
+
+
+def disable():
+    """Make ``charset_normalizer.from_bytes`` use its own ``mess_ratio``."""
+    from charset_normalizer import api, md
+    api.mess_ratio = md.mess_ratio
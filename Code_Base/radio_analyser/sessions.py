@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.sessions
+~~~~~~~~~~~~~~~~~~~~~~~
+
+A :class:`requests.Session` with the polling helpers of this package
+attached.
+"""
+
+import requests
+
+from .batch import DEFAULT_MAX_IN_FLIGHT, iter_batch
+from .templates import RequestTemplate
+
+
+class Session(requests.Session):
+    """A :class:`requests.Session` for polling many radio endpoints.
+
+    Behaves exactly like its parent for single requests.
+    """
+
+    def fetch_all(self, requests, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                  per_host=None, raise_on_error=True, **kwargs):
+        """Send many requests concurrently, yielding results as they complete.
+
+        See :func:`radio_analyser.batch.iter_batch` for the parameters.
+
+        :rtype: generator of :class:`radio_analyser.batch.BatchResult`
+        """
+        return iter_batch(self, requests, max_in_flight=max_in_flight,
+                          per_host=per_host, raise_on_error=raise_on_error,
+                          **kwargs)
+
+    def template(self, method, url, **kwargs):
+        """Compile a request that will be sent repeatedly.
+
+        Takes the same arguments as :class:`requests.Request`; see
+        :class:`radio_analyser.templates.RequestTemplate`.
+
+        :rtype: radio_analyser.templates.RequestTemplate
+        """
+        return RequestTemplate(self, method, url, **kwargs)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.streaming
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Incremental JSON decoding for :class:`requests.Response` bodies.
+
+``Response.json()`` materialises the whole body (and, when the encoding has
+to be sniffed, a second ``str`` copy of it) before parsing. The helpers here
+instead split the body into top-level records as chunks arrive off the
+socket, so peak memory is bounded by the largest record rather than by the
+payload.
+"""
+
+import codecs
+import json
+import re
+
+from requests.utils import guess_json_utf
+
+#: Size of the chunks pulled from ``Response.iter_content``.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Characters that can change nesting state outside of a string.
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+# Characters that can end (or escape inside) a string.
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Characters that terminate a bare scalar (number, true, false, null).
+_SCALAR_END = re.compile(r'[\s,\]]')
+# First character that is not insignificant whitespace.
+_NON_WS = re.compile(u'[^\\s\\ufeff]')
+
+# What may come next inside a top-level array.
+_FIRST = 0       # an element or the closing bracket
+_VALUE = 1       # an element, after a comma
+_SEPARATOR = 2   # a comma or the closing bracket, after an element
+
+
+class JSONRecordSplitter(object):
+    """Splits a stream of JSON text into top-level records.
+
+    Two layouts are supported:
+
+    * a top-level array (``[...]``), whose elements are yielded one by one;
+    * a sequence of whitespace separated values (NDJSON / JSON Lines),
+      whose values are yielded one by one.
+
+    Unless ``lines`` says which, the layout is guessed from the first
+    significant character, so JSON Lines whose first record is an array
+    must be split with ``lines=True``.
+
+    Each chunk is scanned once, where the previous :meth:`feed` stopped.
+    The pieces of a record spanning several chunks are kept in a list and
+    joined once, when the record is complete, so the total work is linear
+    in the size of the payload however it is chunked.
+
+    :param loads: (optional) callable used to decode each record's text.
+    :param lines: (optional) ``True`` for JSON Lines, ``False`` for a
+        top-level array, ``None`` to guess.
+    """
+
+    def __init__(self, loads=json.loads, lines=None):
+        self._loads = loads
+        self._lines = lines
+        self._buf = u''
+        self._parts = []
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._scalar = False
+        self._array = None
+        self._expect = _FIRST
+        self._finished = False
+
+    def feed(self, text):
+        """Add ``text`` to the stream and yield every record it completes.
+
+        :raises json.JSONDecodeError: if the stream is not valid JSON.
+        :rtype: generator
+        """
+        if not text:
+            return
+        if self._finished:
+            if _NON_WS.search(text):
+                raise self._error('Extra data after end of array', 0)
+            return
+        self._buf = text
+        for record in self._scan():
+            yield record
+        self._carry()
+
+    def close(self):
+        """Signal the end of the stream, yielding a trailing bare scalar.
+
+        :raises json.JSONDecodeError: if the stream ends mid-record or an
+            array was never closed.
+        :rtype: generator
+        """
+        if self._start is not None:
+            if not self._scalar:
+                raise self._error('Unterminated JSON record', 0)
+            text = u''.join(self._parts)
+            self._parts = []
+            self._start = None
+            yield self._decode(text)
+        if self._array and not self._finished:
+            raise self._error('Unterminated JSON array', 0)
+
+    def _scan(self):
+        buf = self._buf
+        size = len(buf)
+        while self._pos < size and not self._finished:
+            if self._array is None:
+                match = _NON_WS.search(buf, self._pos)
+                if match is None:
+                    self._pos = size
+                    break
+                char = match.group()
+                if self._lines is None:
+                    self._array = char == '['
+                else:
+                    self._array = not self._lines
+                    if self._array and char != '[':
+                        raise self._error('Expecting top-level array',
+                                          match.start())
+                self._pos = match.end() if self._array else match.start()
+                continue
+
+            if self._start is None:
+                match = _NON_WS.search(buf, self._pos)
+                if match is None:
+                    self._pos = size
+                    break
+                char = match.group()
+                if self._array:
+                    if char == ']' and self._expect != _VALUE:
+                        self._finished = True
+                        if _NON_WS.search(buf, match.end()):
+                            raise self._error(
+                                'Extra data after end of array', match.end())
+                        self._pos = size
+                        break
+                    if self._expect == _SEPARATOR:
+                        if char != ',':
+                            raise self._error(
+                                "Expecting ',' delimiter", match.start())
+                        self._expect = _VALUE
+                        self._pos = match.end()
+                        continue
+                    if char in ',]':
+                        raise self._error('Expecting value', match.start())
+                    self._expect = _SEPARATOR
+                self._start = match.start()
+                self._pos = match.end()
+                if char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth = 1
+                else:
+                    self._scalar = True
+                continue
+
+            if self._scalar:
+                match = _SCALAR_END.search(buf, self._pos)
+                if match is None:
+                    self._pos = size
+                    break
+                end = match.start()
+            elif self._in_string:
+                match = _STRING_SPECIAL.search(buf, self._pos)
+                if match is None:
+                    self._pos = size
+                    break
+                if match.group() == '\\':
+                    # Skip the escaped character, even if it has not
+                    # arrived yet; scanning resumes past it next time.
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                if self._depth:
+                    continue
+                end = self._pos
+            else:
+                match = _STRUCTURAL.search(buf, self._pos)
+                if match is None:
+                    self._pos = size
+                    break
+                char = match.group()
+                self._pos = match.end()
+                if char == '"':
+                    self._in_string = True
+                    continue
+                if char in '{[':
+                    self._depth += 1
+                    continue
+                self._depth -= 1
+                if self._depth:
+                    continue
+                end = self._pos
+
+            text = buf[self._start:end]
+            if self._parts:
+                self._parts.append(text)
+                text = u''.join(self._parts)
+                self._parts = []
+            self._pos = end
+            self._start = None
+            self._scalar = False
+            yield self._decode(text)
+
+    def _carry(self):
+        # Set aside this chunk's share of the record in progress; nothing
+        # else in it is needed once it has been scanned.
+        if self._start is not None:
+            self._parts.append(self._buf[self._start:])
+            self._start = 0
+        # An escape at the very end of a chunk leaves _pos past it.
+        self._pos = max(self._pos - len(self._buf), 0)
+        self._buf = u''
+
+    def _decode(self, text):
+        try:
+            return self._loads(text)
+        except ValueError as e:
+            raise self._error('Invalid JSON record: %s' % e, self._pos)
+
+    def _error(self, msg, pos):
+        return json.JSONDecodeError(msg, self._buf, pos)
+
+
+def _iter_text(response, chunk_size):
+    """Decode the body of ``response`` incrementally into text chunks."""
+    chunks = response.iter_content(chunk_size=chunk_size)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= 4:
+            break
+
+    encoding = response.encoding or guess_json_utf(head) or 'utf-8'
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    text = decoder.decode(head)
+    if text:
+        yield text
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def iter_json(response, chunk_size=STREAM_CHUNK_SIZE, lines=None, **kwargs):
+    """Iterate over the JSON records of a response body as they arrive.
+
+    A body holding a top-level array yields its elements; any other body is
+    treated as newline (or whitespace) delimited JSON and yields each value.
+    The body is never held in memory as a whole, so the request should be
+    made with ``stream=True`` to get the benefit.
+
+    :param response: the :class:`requests.Response` to read.
+    :param chunk_size: (optional) number of bytes read from the socket at a
+        time.
+    :param lines: (optional) ``True`` if the body is JSON Lines, ``False``
+        if it is a top-level array. By default this is guessed from its
+        first character, which takes JSON Lines of arrays for an array.
+    :param \\*\\*kwargs: optional arguments that ``json.loads`` takes.
+    :raises json.JSONDecodeError: if the body is not valid JSON.
+    :rtype: generator
+    """
+    if kwargs:
+        def loads(text):
+            return json.loads(text, **kwargs)
+    else:
+        loads = json.loads
+
+    splitter = JSONRecordSplitter(loads=loads, lines=lines)
+    for text in _iter_text(response, chunk_size):
+        for record in splitter.feed(text):
+            yield record
+    for record in splitter.close():
+        yield record
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+radio_analyser.templates
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Precompiled requests for endpoints that are polled over and over.
+
+``Session.request`` re-parses and re-quotes the URL, re-merges session
+headers, params and hooks, re-reads proxy settings from the environment and
+re-parses the netrc file on every call. A :class:`RequestTemplate` does all
+of that once and, on each send, only copies the prepared request, attaches
+the session's current cookies and applies whatever changed for that call.
+
+The compiled state is rebuilt automatically whenever something it was
+derived from changes: the proxy/CA environment variables, the netrc file, or
+the session's headers, params, auth, proxies, hooks and TLS settings.
+"""
+
+import os
+
+from requests.cookies import (RequestsCookieJar, cookiejar_from_dict,
+                              merge_cookies)
+from requests.auth import HTTPBasicAuth
+from requests.hooks import default_hooks
+from requests.models import PreparedRequest
+from requests.sessions import merge_hooks, merge_setting
+from requests.structures import CaseInsensitiveDict
+from requests.utils import NETRC_FILES, get_netrc_auth
+
+#: Environment variables that preparation of an HTTP(S) request depends on.
+_ENV_KEYS = tuple(
+    name for base in ('http_proxy', 'https_proxy', 'all_proxy', 'no_proxy')
+    for name in (base, base.upper())
+) + ('REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE', 'NETRC', 'HOME')
+
+#: Per-send settings that are merged with the environment.
+_ENV_SETTINGS = ('proxies', 'stream', 'verify', 'cert')
+
+
+def _environment_fingerprint():
+    get = os.environ.get
+    return tuple(get(k) for k in _ENV_KEYS)
+
+
+def _netrc_fingerprint():
+    netrc_file = os.environ.get('NETRC')
+    if netrc_file is not None:
+        locations = (netrc_file,)
+    else:
+        locations = ('~/{}'.format(f) for f in NETRC_FILES)
+    mtimes = []
+    for location in locations:
+        try:
+            st = os.stat(os.path.expanduser(location))
+        except (OSError, KeyError):
+            mtimes.append(None)
+        else:
+            mtimes.append((st.st_mtime_ns, st.st_size))
+    return tuple(mtimes)
+
+
+def _freeze(value):
+    """Return a comparable snapshot of a (possibly nested) session setting."""
+    if isinstance(value, (dict, CaseInsensitiveDict)):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return value
+    # Auth objects, hook callables and the like compare by identity.
+    return ('id', id(value))
+
+
+def _session_fingerprint(session):
+    return _freeze((session.headers, session.params, session.auth,
+                    session.proxies, session.hooks, session.stream,
+                    session.verify, session.cert, session.trust_env))
+
+
+class RequestTemplate(object):
+    """A request compiled against a :class:`requests.Session`.
+
+    Usage::
+
+      >>> from radio_analyser import Session
+      >>> s = Session()
+      >>> status = s.template('GET', 'http://radio.local/status.json')
+      >>> r = status.send(timeout=5)
+
+    Takes the same arguments as :class:`requests.Request`. The body must be
+    reusable (``bytes``, ``str``, a dict of form fields or a JSON
+    document); file uploads and generators are rejected.
+    """
+
+    def __init__(self, session, method, url, headers=None, files=None,
+                 data=None, params=None, auth=None, cookies=None, hooks=None,
+                 json=None):
+        if files or hasattr(data, 'read') or hasattr(data, '__next__'):
+            raise ValueError('Request templates need a reusable body.')
+        self.session = session
+        self.method = method.upper()
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.params = params
+        self.auth = auth
+        self.cookies = cookies
+        self.hooks = hooks
+        self.json = json
+
+        self._fingerprint = None
+        self._prepared = None
+        self._auth = None
+        self._settings = None
+
+    def __repr__(self):
+        return '<RequestTemplate [%s %s]>' % (self.method, self.url)
+
+    def _current_fingerprint(self):
+        session = self.session
+        netrc = None
+        if session.trust_env and not self.auth and not session.auth:
+            netrc = _netrc_fingerprint()
+        return (_environment_fingerprint(), netrc,
+                _session_fingerprint(session))
+
+    def compile(self):
+        """(Re)build the prepared request and environment settings."""
+        session = self.session
+        fingerprint = self._current_fingerprint()
+
+        # Set environment's basic authentication if not explicitly set.
+        auth = self.auth
+        if session.trust_env and not auth and not session.auth:
+            auth = get_netrc_auth(self.url)
+        auth = merge_setting(auth, session.auth)
+
+        p = PreparedRequest()
+        p.prepare(
+            method=self.method,
+            url=self.url,
+            data=self.data or {},
+            json=self.json,
+            headers=merge_setting(self.headers or {}, session.headers,
+                                  dict_class=CaseInsensitiveDict),
+            params=merge_setting(self.params or {}, session.params),
+            hooks=merge_hooks(self.hooks, session.hooks),
+        )
+
+        # Basic credentials are just a header and can be baked in; any
+        # other auth may keep per-request state, so it runs on each send.
+        if isinstance(auth, tuple) and len(auth) == 2:
+            auth = HTTPBasicAuth(*auth)
+        if type(auth) is HTTPBasicAuth:
+            p.prepare_auth(auth)
+            auth = None
+
+        self._prepared = p
+        self._auth = auth
+        self._settings = session.merge_environment_settings(
+            p.url, {}, None, None, None)
+        self._fingerprint = fingerprint
+
+    def prepare(self, headers=None, data=None, json=None):
+        """Return a fresh :class:`requests.PreparedRequest` for one send.
+
+        :param headers: (optional) headers to add for this send only.
+        :param data: (optional) body replacing the template's.
+        :param json: (optional) JSON document replacing the template's body.
+        :rtype: requests.PreparedRequest
+        """
+        if self._fingerprint != self._current_fingerprint():
+            self.compile()
+        template = self._prepared
+
+        p = PreparedRequest()
+        p.method = template.method
+        p.url = template.url
+        p.headers = template.headers.copy()
+        p.body = template.body
+        p.hooks = default_hooks()
+        for event, hooks in template.hooks.items():
+            p.hooks[event] = list(hooks)
+        p._body_position = None
+
+        if data is not None or json is not None:
+            # The new body sets its own Content-Type, not the template's.
+            p.headers.pop('Content-Type', None)
+            p.prepare_body(data, None, json)
+        if headers:
+            p.headers.update(headers)
+
+        cookies = self.session.cookies
+        if self.cookies:
+            extra = self.cookies
+            if not isinstance(extra, RequestsCookieJar):
+                extra = cookiejar_from_dict(extra)
+            cookies = merge_cookies(
+                merge_cookies(RequestsCookieJar(), cookies), extra)
+        p.prepare_cookies(cookies)
+
+        if self._auth is not None:
+            p.prepare_auth(self._auth)
+        return p
+
+    def send(self, headers=None, data=None, json=None, **kwargs):
+        """Send the request, returning a :class:`requests.Response`.
+
+        :param headers: (optional) headers to add for this send only.
+        :param data: (optional) body replacing the template's.
+        :param json: (optional) JSON document replacing the template's body.
+        :param \\*\\*kwargs: optional arguments that ``Session.request``
+            takes for sending, e.g. ``timeout``, ``allow_redirects``,
+            ``stream``, ``verify``, ``cert``, ``proxies``.
+        :rtype: requests.Response
+        """
+        p = self.prepare(headers, data, json)
+        if any(kwargs.get(name) is not None for name in _ENV_SETTINGS):
+            settings = self.session.merge_environment_settings(
+                p.url, kwargs.pop('proxies', None) or {},
+                kwargs.pop('stream', None), kwargs.pop('verify', None),
+                kwargs.pop('cert', None))
+        else:
+            settings = self._settings
+        send_kwargs = {'allow_redirects': True}
+        send_kwargs.update(kwargs)
+        send_kwargs.update(settings)
+        return self.session.send(p, **send_kwargs)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.alerts."""
+
+import subprocess
+import threading
+import time
+
+import pytest
+
+from radio_analyser.alerts import (EVENTS, AlertError, AlertPlayer, NullSink,
+                                   SubprocessSink, load_theme)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BlockingSink(NullSink):
+    """Holds every sound until ``release`` is set."""
+
+    def __init__(self):
+        super(BlockingSink, self).__init__()
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def play(self, event, data, path):
+        self.started.set()
+        self.release.wait(5)
+        super(BlockingSink, self).play(event, data, path)
+
+
+class FailingSink(object):
+
+    def play(self, event, data, path):
+        raise AlertError('no audio device')
+
+
+def test_load_theme():
+    sounds = load_theme('chime')
+    assert set(sounds) == set(EVENTS)
+    data, path = sounds['error']
+    assert data == path.read_bytes()
+    with pytest.raises(ValueError):
+        load_theme('no-such-theme')
+
+
+def test_plays_events():
+    sink = NullSink()
+    with AlertPlayer(sink=sink) as alerts:
+        assert alerts.success() and alerts.error()
+        alerts.join()
+    assert sink.played == ['success', 'error']
+    assert alerts.stats['played'] == 2
+    with pytest.raises(ValueError):
+        alerts.notify('explosion')
+
+
+def test_coalesces_within_window():
+    sink, clock = NullSink(), FakeClock()
+    with AlertPlayer(sink=sink, window=1.0, clock=clock) as alerts:
+        assert alerts.warning() is True
+        assert alerts.warning() is False
+        assert alerts.info() is True
+        clock.now = 0.5
+        assert alerts.warning() is False
+        clock.now = 1.0
+        assert alerts.warning() is True
+    assert sink.played == ['warning', 'info', 'warning']
+    assert alerts.stats['coalesced'] == 2
+    assert alerts.stats['accepted'] == 3
+
+
+def test_drops_when_queue_is_full():
+    sink = BlockingSink()
+    alerts = AlertPlayer(sink=sink, window=0, max_queue=2)
+    try:
+        alerts.error()
+        assert sink.started.wait(5)
+        results = [alerts.error() for _ in range(4)]
+        assert results == [True, True, False, False]
+        assert alerts.stats['dropped'] == 2
+    finally:
+        sink.release.set()
+        alerts.close()
+    assert alerts.stats['played'] == 3
+
+
+def test_on_error_receives_failures():
+    errors = []
+    with AlertPlayer(sink=FailingSink(), on_error=errors.append) as alerts:
+        alerts.error()
+        alerts.join()
+    assert [str(e) for e in errors] == ['no audio device']
+    assert alerts.stats['failed'] == 1
+
+
+def test_failures_warn_without_on_error():
+    with pytest.warns(RuntimeWarning):
+        with AlertPlayer(sink=FailingSink()) as alerts:
+            alerts.error()
+            alerts.join()
+
+
+def test_on_error_exceptions_are_swallowed():
+    def on_error(exc):
+        raise KeyError('bad handler')
+
+    sink = NullSink()
+    alerts = AlertPlayer(sink=FailingSink(), on_error=on_error)
+    alerts.error()
+    alerts.join()
+    alerts.sink = sink
+    alerts.info()
+    alerts.close()
+    assert sink.played == ['info']
+
+
+def test_close_plays_queued_sounds():
+    sink = NullSink()
+    alerts = AlertPlayer(sink=sink)
+    for event in EVENTS:
+        alerts.notify(event)
+    alerts.close()
+    assert sink.played == list(EVENTS)
+    assert not alerts._worker.is_alive()
+    with pytest.raises(RuntimeError):
+        alerts.info()
+    alerts.close()
+
+
+def test_close_times_out_with_full_queue_and_stuck_sink():
+    sink = BlockingSink()
+    alerts = AlertPlayer(sink=sink, window=0, max_queue=1)
+    alerts.error()
+    assert sink.started.wait(5)
+    alerts.error()
+
+    start = time.monotonic()
+    alerts.close(timeout=0.2)
+    assert time.monotonic() - start < 2
+
+    sink.release.set()
+    alerts._worker.join(5)
+    assert not alerts._worker.is_alive()
+    assert sink.played == ['error']
+    assert alerts.stats['dropped'] == 1
+
+
+def test_close_times_out_with_stuck_sink():
+    sink = BlockingSink()
+    alerts = AlertPlayer(sink=sink, window=0)
+    alerts.error()
+    assert sink.started.wait(5)
+    alerts.warning()
+
+    start = time.monotonic()
+    alerts.close(timeout=0.2)
+    assert time.monotonic() - start < 2
+    sink.release.set()
+    alerts._worker.join(5)
+    assert not alerts._worker.is_alive()
+    assert sink.played == ['error']
+
+
+def test_subprocess_sink_unsupported_platform():
+    with pytest.raises(AlertError):
+        SubprocessSink(system='Plan9').play('error', b'', 'error.wav')
+
+
+def test_subprocess_sink_timeout(monkeypatch):
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(kwargs['timeout'])
+        raise subprocess.TimeoutExpired(args, kwargs['timeout'])
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    with pytest.raises(AlertError) as info:
+        SubprocessSink(system='Linux', timeout=3).play('error', b'', 'e.wav')
+    assert calls == [3]
+    assert 'did not finish' in str(info.value)
+
+
+def test_subprocess_sink_missing_player(monkeypatch):
+    def run(args, **kwargs):
+        raise FileNotFoundError(2, 'No such file or directory')
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    with pytest.raises(AlertError):
+        SubprocessSink(system='Darwin').play('error', b'', 'e.wav')
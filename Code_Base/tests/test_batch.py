@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.batch."""
+
+import collections
+import threading
+import time
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from radio_analyser.batch import host_key, host_limit, iter_batch
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Answers every request locally, recording concurrency per host."""
+
+    def __init__(self, delay=0.01, fail=(), **kwargs):
+        super(RecordingAdapter, self).__init__(**kwargs)
+        self.delay = delay
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+        self.running = collections.Counter()
+        self.peak = collections.Counter()
+        self.total = 0
+        self.peak_total = 0
+        self.sent = []
+        self.closed = []
+
+    def send(self, request, **kwargs):
+        key = host_key(request.url)
+        with self.lock:
+            self.running[key] += 1
+            self.total += 1
+            self.peak[key] = max(self.peak[key], self.running[key])
+            self.peak_total = max(self.peak_total, self.total)
+            self.sent.append(request.url)
+        try:
+            time.sleep(self.delay)
+            if request.url in self.fail:
+                raise requests.ConnectionError('unreachable')
+            response = requests.Response()
+            response.status_code = 200
+            response.url = request.url
+            response.close = lambda: self.closed.append(request.url)
+            return response
+        finally:
+            with self.lock:
+                self.running[key] -= 1
+                self.total -= 1
+
+
+def _session(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    return session
+
+
+def _requests(hosts, per_host):
+    return [requests.Request('GET', 'http://%s/status/%d' % (host, i))
+            for i in range(per_host) for host in hosts]
+
+
+def test_host_key_defaults_port_and_lowercases():
+    assert host_key('http://Radio.Local/x') == ('http', 'radio.local', 80)
+    assert host_key('HTTPS://radio.local:8443/') == (
+        'https', 'radio.local', 8443)
+
+
+def test_host_limit_is_pool_maxsize():
+    session = _session(RecordingAdapter(pool_maxsize=3))
+    assert host_limit(session, 'http://a/') == 3
+
+
+def test_yields_every_response():
+    adapter = RecordingAdapter(delay=0)
+    batch = _requests(['a', 'b', 'c'], 5)
+    results = list(iter_batch(_session(adapter), batch))
+    assert sorted(r.response.url for r in results) == sorted(
+        r.url for r in batch)
+    assert all(r.ok and r.exception is None for r in results)
+
+
+def test_respects_pool_maxsize_and_per_host():
+    adapter = RecordingAdapter(pool_maxsize=3)
+    list(iter_batch(_session(adapter), _requests(['a', 'b'], 8),
+                    max_in_flight=16))
+    assert max(adapter.peak.values()) == 3
+
+    adapter = RecordingAdapter(pool_maxsize=3)
+    list(iter_batch(_session(adapter), _requests(['a', 'b'], 8),
+                    max_in_flight=16, per_host=2))
+    assert max(adapter.peak.values()) == 2
+
+
+def test_respects_max_in_flight():
+    adapter = RecordingAdapter()
+    list(iter_batch(_session(adapter), _requests('abcdefgh', 3),
+                    max_in_flight=4))
+    assert adapter.peak_total <= 4
+
+
+def test_max_in_flight_must_be_positive():
+    with pytest.raises(ValueError):
+        list(iter_batch(requests.Session(), [], max_in_flight=0))
+
+
+def test_reads_iterable_lazily():
+    adapter = RecordingAdapter(delay=0)
+    pulled = []
+
+    def generate():
+        for request in _requests(['a'], 100):
+            pulled.append(request)
+            yield request
+
+    results = iter_batch(_session(adapter), generate(), max_in_flight=2,
+                         max_deferred=3)
+    next(results)
+    # At most two in flight, three parked, and one being admitted.
+    assert len(pulled) <= 2 + 3 + 1
+    results.close()
+
+
+def test_failure_cancels_batch_and_closes_in_flight():
+    batch = _requests(['a', 'b', 'c', 'd'], 10)
+    adapter = RecordingAdapter(fail=[batch[0].url])
+    with pytest.raises(requests.ConnectionError):
+        list(iter_batch(_session(adapter), batch, max_in_flight=4))
+    assert len(adapter.sent) < len(batch)
+    assert adapter.total == 0
+
+
+def test_failures_yielded_without_raise_on_error():
+    batch = _requests(['a', 'b'], 3)
+    adapter = RecordingAdapter(delay=0, fail=[batch[0].url])
+    results = list(iter_batch(_session(adapter), batch,
+                              raise_on_error=False))
+    assert len(results) == len(batch)
+    failed = [r for r in results if not r.ok]
+    assert len(failed) == 1
+    assert failed[0].request is batch[0]
+    assert failed[0].response is None
+    assert isinstance(failed[0].exception, requests.ConnectionError)
+
+
+def test_early_exit_closes_unconsumed_responses():
+    adapter = RecordingAdapter(delay=0.02)
+    results = iter_batch(_session(adapter), _requests(['a', 'b', 'c'], 4),
+                         max_in_flight=3)
+    first = next(results)
+    results.close()
+    assert adapter.total == 0
+    # Responses finished but never yielded are closed, the yielded one is
+    # left to the caller.
+    assert first.response.url not in adapter.closed
+    assert len(adapter.sent) < 12
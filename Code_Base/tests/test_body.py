@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.body."""
+
+import gzip
+import io
+import json
+import pickle
+import socket
+import threading
+import tracemalloc
+
+import pytest
+import requests
+
+from radio_analyser.body import (MAX_INITIAL_BUFFER_SIZE, BufferedResponse,
+                                 read_buffer)
+
+BODY = json.dumps([{'station': 'Radio %d' % i, 'rssi': -i}
+                   for i in range(5000)]).encode('utf-8')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 1000, 1 << 20])
+def test_reads_identity_body(server, chunk_size):
+    server.handler = lambda r: (200, {}, BODY)
+    response = requests.get(server.url + '/', stream=True)
+    data = read_buffer(response, chunk_size)
+    assert isinstance(data, bytearray)
+    assert data == BODY
+    assert json.loads(data) == json.loads(BODY)
+
+
+def test_reads_compressed_body(server):
+    server.handler = lambda r: (200, {'Content-Encoding': 'gzip'},
+                                gzip.compress(BODY))
+    response = requests.get(server.url + '/', stream=True)
+    assert read_buffer(response, 4096) == BODY
+
+
+def test_reads_body_without_length():
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(BODY)
+    assert read_buffer(response, 1024) == BODY
+
+
+def test_content_is_served_from_buffer(server):
+    server.handler = lambda r: (200, {}, BODY)
+    response = requests.get(server.url + '/', stream=True)
+    data = read_buffer(response)
+    assert isinstance(response, BufferedResponse)
+    assert response.buffer is data
+    assert read_buffer(response) is data
+
+    assert response._content is False
+    assert type(response.content) is bytes
+    assert response.content == BODY
+    assert response.json() == json.loads(BODY)
+    assert b''.join(response.iter_content(4096)) == BODY
+
+
+def test_buffered_response_pickles(server):
+    server.handler = lambda r: (200, {}, b'{"rssi": -71}')
+    response = requests.get(server.url + '/', stream=True)
+    read_buffer(response)
+    clone = pickle.loads(pickle.dumps(response))
+    assert clone.content == b'{"rssi": -71}'
+    assert clone.json() == {'rssi': -71}
+
+
+def test_response_subclass_keeps_its_class(server):
+    class RadioResponse(requests.Response):
+        pass
+
+    response = requests.get(server.url + '/', stream=True)
+    response.__class__ = RadioResponse
+    read_buffer(response)
+    assert isinstance(response, RadioResponse)
+    assert response.content == b'ok'
+
+
+def test_bogus_content_length_is_not_preallocated():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def serve():
+        conn, _ = listener.accept()
+        conn.recv(65536)
+        conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2000000000\r\n'
+                     b'\r\nshort!!')
+        conn.close()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    url = 'http://127.0.0.1:%d/' % listener.getsockname()[1]
+    tracemalloc.start()
+    try:
+        response = requests.get(url, stream=True)
+        try:
+            assert read_buffer(response) == b'short!!'
+        except requests.exceptions.ChunkedEncodingError:
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        thread.join(5)
+        listener.close()
+    assert peak < 2 * MAX_INITIAL_BUFFER_SIZE
+
+
+def test_already_read_content_is_not_copied(server):
+    server.handler = lambda r: (200, {}, BODY)
+    response = requests.get(server.url + '/')
+    assert isinstance(response.content, bytes)
+    view = read_buffer(response)
+    assert isinstance(view, memoryview)
+    assert view.obj is response.content
+    assert isinstance(response.content, bytes)
+
+
+def test_connection_is_reused(server):
+    server.handler = lambda r: (200, {}, BODY)
+    session = requests.Session()
+    for _ in range(3):
+        read_buffer(session.get(server.url + '/', stream=True))
+    assert server.connections == 1
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.cache."""
+
+import os
+import pickle
+
+import pytest
+import requests
+
+from radio_analyser.cache import CachingAdapter, DiskCache, parse_cache_control
+
+
+def _etag_handler(request):
+    if request.headers.get('If-None-Match') == '"v1"':
+        return 304, {'ETag': '"v1"'}, b''
+    return 200, {'ETag': '"v1"', 'Content-Type': 'application/json'}, \
+        b'{"rssi": -71}'
+
+
+def _session(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    return session
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('No-Cache, max-age="60", ,private') == {
+        'no-cache': True, 'max-age': '60', 'private': True}
+    assert parse_cache_control(None) == {}
+
+
+def test_revalidation_rebuilds_response(server):
+    server.handler = _etag_handler
+    adapter = CachingAdapter()
+    session = _session(adapter)
+
+    first = session.get(server.url + '/status')
+    second = session.get(server.url + '/status')
+
+    assert first.from_cache is False
+    assert second.from_cache is True
+    assert second.status_code == 200
+    assert second.json() == {'rssi': -71}
+    assert server.requests[1][2].get('If-None-Match') == '"v1"'
+    assert adapter.stats.as_dict()['revalidated'] == 1
+
+
+def test_revalidation_reuses_connection(server):
+    server.handler = _etag_handler
+    session = _session(CachingAdapter())
+    for _ in range(5):
+        assert session.get(server.url + '/status').json() == {'rssi': -71}
+    assert len(server.requests) == 5
+    assert server.connections == 1
+
+
+def test_fresh_entry_skips_network(server):
+    server.handler = lambda r: (200, {'Cache-Control': 'max-age=60'}, b'x')
+    session = _session(CachingAdapter())
+    session.get(server.url + '/fresh')
+    response = session.get(server.url + '/fresh')
+    assert response.from_cache is True
+    assert response.content == b'x'
+    assert len(server.requests) == 1
+
+
+def test_unsafe_method_invalidates(server):
+    server.handler = lambda r: (200, {'Cache-Control': 'max-age=60'}, b'x')
+    session = _session(CachingAdapter())
+    session.get(server.url + '/fresh')
+    session.post(server.url + '/fresh', data=b'y')
+    assert session.get(server.url + '/fresh').from_cache is False
+
+
+def test_disk_tier_survives_new_adapter(server, tmp_path):
+    server.handler = _etag_handler
+    _session(CachingAdapter(cache_dir=str(tmp_path))).get(
+        server.url + '/status')
+    response = _session(CachingAdapter(cache_dir=str(tmp_path))).get(
+        server.url + '/status')
+    assert response.from_cache is True
+    assert response.json() == {'rssi': -71}
+
+
+def test_disk_clear_only_removes_own_entries(tmp_path):
+    foreign = tmp_path / 'notes.txt'
+    foreign.write_bytes(b'keep me')
+    other_hex = tmp_path / ('0' * 64)
+    other_hex.write_bytes(b'keep me too')
+
+    cache = DiskCache(str(tmp_path))
+    cache.set('GET http://a/', {'key': 'GET http://a/'})
+    assert cache.get('GET http://a/') == {'key': 'GET http://a/'}
+    cache.clear()
+
+    assert cache.get('GET http://a/') is None
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        ['notes.txt', '0' * 64])
+
+
+def test_disk_get_ignores_foreign_files(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    key = 'GET http://a/'
+    path = cache._path(key)
+    assert path.endswith(DiskCache.suffix)
+    # A file at the bare digest is not one of ours and is never unpickled.
+    with open(path[:-len(DiskCache.suffix)], 'wb') as f:
+        pickle.dump({'key': key}, f)
+    assert cache.get(key) is None
+
+
+def test_disk_get_rejects_other_key(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    with open(cache._path('GET http://a/'), 'wb') as f:
+        pickle.dump({'key': 'GET http://b/'}, f)
+    assert cache.get('GET http://a/') is None
+
+
+@pytest.mark.parametrize('content', [b'', b'garbage'])
+def test_disk_get_tolerates_corrupt_files(tmp_path, content):
+    cache = DiskCache(str(tmp_path))
+    with open(cache._path('k'), 'wb') as f:
+        f.write(content)
+    assert cache.get('k') is None
+
+
+def test_pickled_adapter_keeps_settings(tmp_path):
+    adapter = CachingAdapter(cache_dir=str(tmp_path), max_entries=3,
+                             max_bytes=100)
+    clone = pickle.loads(pickle.dumps(adapter))
+    assert clone.disk.directory == str(tmp_path)
+    assert (clone.memory.max_entries, clone.memory.max_bytes) == (3, 100)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.encoding."""
+
+import json
+
+import pytest
+import requests
+from charset_normalizer import api, md
+
+from radio_analyser import mess
+from radio_analyser.encoding import (DEVICE_ENCODINGS, EncodingCache,
+                                     detect_json_encoding, load_json)
+
+DOCUMENT = [{'station': u'Radio Café Señal', 'city': u'Zürich',
+             'tags': [u'fréquence', u'übertragung']}] * 8
+TEXT = json.dumps(DOCUMENT, ensure_ascii=False)
+
+
+def _response(body, url='http://radio.local/status.json', encoding=None):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.encoding = encoding
+    return response
+
+
+@pytest.mark.parametrize('codec', ['utf-8', 'utf-16-le', 'utf-16-be',
+                                   'utf-32-le', 'utf-8-sig'])
+def test_utf_detected_from_first_bytes(codec):
+    body = TEXT.encode(codec)
+    assert load_json(_response(body)) == DOCUMENT
+
+
+@pytest.mark.parametrize('codec', ['cp1252', 'latin_1', 'cp1251', 'koi8_r'])
+def test_matches_response_json(codec):
+    body = json.dumps([{'station': u'Съешь ещё Café'}] * 8,
+                      ensure_ascii=False).encode(codec, errors='replace')
+    expected = _response(body).json()
+    assert load_json(_response(body)) == expected
+    mess.enable()
+    try:
+        assert load_json(_response(body)) == expected
+    finally:
+        mess.disable()
+
+
+def test_leaves_charset_normalizer_alone():
+    load_json(_response(TEXT.encode('cp1252')))
+    assert api.mess_ratio is md.mess_ratio
+
+
+def test_explicit_encoding_is_honoured():
+    body = TEXT.encode('cp1252')
+    assert load_json(_response(body, encoding='cp1252')) == DOCUMENT
+
+
+def test_candidates_restrict_detection():
+    body = TEXT.encode('cp1252')
+    assert detect_json_encoding(body, DEVICE_ENCODINGS) in DEVICE_ENCODINGS
+
+
+def test_cache_remembers_host():
+    cache = EncodingCache(candidates=['cp1252'])
+    body = TEXT.encode('cp1252')
+    assert load_json(_response(body), cache=cache) == DOCUMENT
+    assert cache.get('radio.local') == 'cp1252'
+    assert load_json(_response(body, url='http://other.local/'),
+                     cache=cache) == DOCUMENT
+    assert cache.get('other.local') == 'cp1252'
+
+    # UTF bodies never consult the remembered codec.
+    assert load_json(_response(TEXT.encode('utf-8')), cache=cache) == DOCUMENT
+    cache.clear()
+    assert cache.get('radio.local') is None
+
+
+def test_cache_redetects_when_codec_stops_working():
+    cache = EncodingCache()
+    cache._encodings['radio.local'] = 'ascii'
+    body = TEXT.encode('cp1252')
+    load_json(_response(body), cache=cache)
+    assert cache.get('radio.local') != 'ascii'
+
+
+def test_loads_kwargs_are_passed():
+    body = b'{"rssi": 1.5}'
+    assert load_json(_response(body), parse_float=str) == {'rssi': '1.5'}
+
+
+def test_invalid_json_raises():
+    with pytest.raises(ValueError):
+        load_json(_response(b'{"rssi": '))
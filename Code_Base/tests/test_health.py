@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.health."""
+
+import io
+import pickle
+import socket
+import threading
+
+import pytest
+import requests
+
+from radio_analyser import health
+from radio_analyser.health import (CLOSED, HALF_OPEN, OPEN,
+                                   CircuitBreakerAdapter, CircuitOpenError,
+                                   HealthTracker)
+
+KEY = ('http', 'radio.local', 80)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(health.time, 'sleep', slept.append)
+    return slept
+
+
+def _closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _session(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    return session
+
+
+def _tracker(**kwargs):
+    kwargs.setdefault('clock', FakeClock())
+    return HealthTracker(**kwargs)
+
+
+def test_circuit_opens_half_opens_and_closes():
+    tracker = _tracker(failure_threshold=2, recovery_timeout=10)
+    for _ in range(2):
+        tracker.before_request(KEY)
+        tracker.record_failure(KEY)
+    assert tracker.state(KEY) == OPEN
+    with pytest.raises(CircuitOpenError):
+        tracker.before_request(KEY)
+
+    tracker.clock.now += 10
+    tracker.before_request(KEY)
+    assert tracker.state(KEY) == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        tracker.before_request(KEY)
+
+    tracker.record_success(KEY)
+    assert tracker.state(KEY) == CLOSED
+    assert tracker.snapshot()[KEY]['rejected'] == 2
+
+
+def test_failed_probe_reopens():
+    tracker = _tracker(failure_threshold=1, recovery_timeout=10)
+    tracker.before_request(KEY)
+    tracker.record_failure(KEY)
+    tracker.clock.now += 10
+    tracker.before_request(KEY)
+    tracker.record_failure(KEY)
+    assert tracker.state(KEY) == OPEN
+
+
+def test_release_frees_probe():
+    tracker = _tracker(failure_threshold=1, recovery_timeout=10)
+    tracker.before_request(KEY)
+    tracker.record_failure(KEY)
+    tracker.clock.now += 10
+    tracker.before_request(KEY)
+    tracker.release(KEY)
+    tracker.before_request(KEY)
+    assert tracker.state(KEY) == HALF_OPEN
+    assert tracker.snapshot()[KEY]['total_failures'] == 1
+
+
+def test_retry_budget():
+    tracker = _tracker(budget_ratio=0.5, budget_max=1.0)
+    assert tracker.acquire_retry(KEY)
+    assert not tracker.acquire_retry(KEY)
+    tracker.before_request(KEY)
+    tracker.before_request(KEY)
+    assert tracker.acquire_retry(KEY)
+
+
+def test_backoff_honours_retry_after():
+    tracker = _tracker(backoff_factor=0.5, backoff_max=30)
+    assert 0 <= tracker.backoff(KEY, 3) <= 2.0
+    tracker.record_failure(KEY, retry_after=20)
+    assert tracker.backoff(KEY, 1) == 20
+
+
+def test_tracker_pickles_settings_only():
+    tracker = HealthTracker(failure_threshold=7, recovery_timeout=3)
+    tracker.record_failure(KEY)
+    clone = pickle.loads(pickle.dumps(tracker))
+    assert (clone.failure_threshold, clone.recovery_timeout) == (7, 3)
+    assert clone.snapshot() == {}
+    clone.record_failure(KEY)
+
+
+def test_adapter_pickle_keeps_retries_and_tracker():
+    tracker = HealthTracker(failure_threshold=7)
+    adapter = CircuitBreakerAdapter(tracker=tracker, retries=5,
+                                    pool_maxsize=3)
+    clone = pickle.loads(pickle.dumps(adapter))
+    assert clone.retries == 5
+    assert clone.tracker.failure_threshold == 7
+    assert clone.max_retries.total == 0
+    assert clone._pool_maxsize == 3
+
+
+def test_session_pickle_keeps_shared_tracker():
+    tracker = HealthTracker()
+    session = requests.Session()
+    session.mount('http://', CircuitBreakerAdapter(tracker=tracker))
+    session.mount('https://', CircuitBreakerAdapter(tracker=tracker))
+    clone = pickle.loads(pickle.dumps(session))
+    assert (clone.get_adapter('http://a').tracker
+            is clone.get_adapter('https://a').tracker)
+
+
+def test_success_passes_through(server):
+    adapter = CircuitBreakerAdapter()
+    assert _session(adapter).get(server.url + '/').content == b'ok'
+    key = ('http', '127.0.0.1', server.server_address[1])
+    assert adapter.tracker.snapshot()[key]['requests'] == 1
+
+
+def test_retries_failure_statuses(server, no_sleep):
+    statuses = iter([503, 503, 200])
+    server.handler = lambda r: (next(statuses), {}, b'x')
+    adapter = CircuitBreakerAdapter(retries=2)
+    response = _session(adapter).get(server.url + '/')
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+    assert len(no_sleep) == 2
+
+
+def test_gives_up_after_retries(server, no_sleep):
+    server.handler = lambda r: (503, {'Retry-After': '1'}, b'x')
+    adapter = CircuitBreakerAdapter(retries=1)
+    response = _session(adapter).get(server.url + '/')
+    assert response.status_code == 503
+    assert len(server.requests) == 2
+
+
+def test_connection_errors_open_circuit(no_sleep):
+    url = 'http://127.0.0.1:%d/' % _closed_port()
+    adapter = CircuitBreakerAdapter(
+        tracker=HealthTracker(failure_threshold=2), retries=0)
+    session = _session(adapter)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            session.get(url)
+    with pytest.raises(CircuitOpenError):
+        session.get(url)
+
+
+def test_unexpected_error_releases_probe(server):
+    clock = FakeClock()
+    adapter = CircuitBreakerAdapter(
+        tracker=HealthTracker(failure_threshold=1, recovery_timeout=10,
+                              clock=clock))
+    key = ('http', '127.0.0.1', server.server_address[1])
+    adapter.tracker.before_request(key)
+    adapter.tracker.record_failure(key)
+    clock.now += 10
+
+    session = _session(adapter)
+    with pytest.raises(ValueError):
+        session.get(server.url + '/', timeout=(1, 2, 3))
+    assert adapter.tracker.snapshot()[key]['probing'] is False
+    assert adapter.tracker.snapshot()[key]['total_failures'] == 1
+
+    assert session.get(server.url + '/').status_code == 200
+    assert adapter.tracker.state(key) == CLOSED
+
+
+def test_streamed_body_is_not_retried(server, no_sleep):
+    server.handler = lambda r: (503, {}, b'x')
+    adapter = CircuitBreakerAdapter(retries=3)
+    response = _session(adapter).put(server.url + '/',
+                                     data=io.BytesIO(b'ab'))
+    assert response.status_code == 503
+    assert len(server.requests) == 1
+
+
+def test_post_not_retried_on_failure_status(server, no_sleep):
+    server.handler = lambda r: (503, {}, b'x')
+    adapter = CircuitBreakerAdapter(retries=2)
+    response = _session(adapter).post(server.url + '/', data=b'x=1')
+    assert response.status_code == 503
+    assert len(server.requests) == 1
+
+
+def test_post_not_retried_on_read_timeout(server, no_sleep):
+    # no_sleep patches time.sleep for everyone, the server included.
+    def slow(request):
+        threading.Event().wait(0.3)
+        return 200, {}, b'x'
+
+    server.handler = slow
+    adapter = CircuitBreakerAdapter(retries=2)
+    with pytest.raises(requests.ReadTimeout):
+        _session(adapter).post(server.url + '/', data=b'x=1', timeout=0.1)
+    assert len(server.requests) == 1
+    assert no_sleep == []
+
+
+def test_allowed_methods_are_configurable(server, no_sleep):
+    statuses = iter([503, 200])
+    server.handler = lambda r: (next(statuses), {}, b'x')
+    adapter = CircuitBreakerAdapter(retries=2, allowed_methods=None)
+    response = _session(adapter).post(server.url + '/', data=b'x=1')
+    assert response.status_code == 200
+    assert len(server.requests) == 2
+
+    clone = pickle.loads(pickle.dumps(
+        CircuitBreakerAdapter(allowed_methods=frozenset(['POST']))))
+    assert clone.allowed_methods == frozenset(['POST'])
+
+
+def test_status_retries_reuse_connection(server, no_sleep):
+    statuses = iter([503, 502, 200])
+    server.handler = lambda r: (next(statuses), {}, b'error page')
+    response = _session(CircuitBreakerAdapter(retries=2)).get(server.url + '/')
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+    assert server.connections == 1
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.instrumentation."""
+
+import pickle
+
+import requests
+
+from radio_analyser.instrumentation import (
+    BUCKETS, Histogram, Instrumentation, InstrumentedHTTPAdapter,
+)
+
+
+def _session(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    return session
+
+
+def _pool_stats(adapter, server):
+    return adapter.instrumentation.stats(
+        ('http', '127.0.0.1', server.server_address[1]))
+
+
+def test_histogram():
+    h = Histogram()
+    assert h.mean is None and h.percentile(50) is None
+    for value in (0.001, 0.002, 0.003, 100.0):
+        h.add(value)
+    assert h.count == 4
+    assert h.min == 0.001 and h.max == 100.0
+    assert h.percentile(50) == 0.0025
+    assert h.percentile(100) == 100.0
+    assert h.counts[-1] == 1 and len(h.counts) == len(BUCKETS) + 1
+
+
+def test_counts_requests_and_reuse(server):
+    adapter = InstrumentedHTTPAdapter()
+    session = _session(adapter)
+    for _ in range(3):
+        assert session.get(server.url + '/').content == b'ok'
+
+    stats = _pool_stats(adapter, server)
+    assert stats['requests'] == 3
+    assert stats['new_connections'] == 1 == server.connections
+    assert stats['reused_connections'] == 2
+    for name in ('pool_wait', 'connect', 'ttfb', 'body_read'):
+        assert stats[name]['count'] == (1 if name == 'connect' else 3)
+
+
+def test_new_connections_counts_sockets(server):
+    # The server closes every connection, so the pool keeps reusing one
+    # connection object that has to open a new socket each time.
+    server.handler = lambda r: (200, {'Connection': 'close'}, b'ok')
+    adapter = InstrumentedHTTPAdapter()
+    session = _session(adapter)
+    for _ in range(3):
+        session.get(server.url + '/')
+
+    stats = _pool_stats(adapter, server)
+    assert server.connections == 3
+    assert stats['new_connections'] == 3
+    assert stats['connect']['count'] == 3
+
+
+def test_body_read_includes_single_read(server):
+    server.handler = lambda r: (200, {}, b'x' * 65536)
+    adapter = InstrumentedHTTPAdapter()
+    response = _session(adapter).get(server.url + '/', stream=True)
+    assert len(response.raw.read()) == 65536
+
+    body_read = _pool_stats(adapter, server)['body_read']
+    assert body_read['count'] == 1
+    assert body_read['max'] > 0.0
+
+
+def test_body_read_reported_once_per_response(server):
+    adapter = InstrumentedHTTPAdapter()
+    session = _session(adapter)
+    response = session.get(server.url + '/')
+    response.close()
+    session.get(server.url + '/', stream=True).close()
+    assert _pool_stats(adapter, server)['body_read']['count'] == 2
+
+
+def test_callbacks_and_disabled_stats(server):
+    events = []
+    inst = Instrumentation(collect_stats=False)
+    adapter = InstrumentedHTTPAdapter(instrumentation=inst)
+    session = _session(adapter)
+
+    session.get(server.url + '/')
+    assert inst.stats() == {}
+    assert not events
+
+    callback = lambda event, key, value: events.append(event)
+    inst.subscribe(callback)
+    session.get(server.url + '/')
+    assert {'requests', 'pool_wait', 'ttfb', 'body_read',
+            'reused_connections'} <= set(events)
+    assert inst.stats() == {}
+
+    inst.unsubscribe(callback)
+    del events[:]
+    session.get(server.url + '/')
+    assert not events
+    assert inst.enabled is False
+
+
+def test_pickled_adapter_gets_fresh_instrumentation():
+    adapter = InstrumentedHTTPAdapter(pool_maxsize=4)
+    clone = pickle.loads(pickle.dumps(adapter))
+    assert isinstance(clone.instrumentation, Instrumentation)
+    assert clone.instrumentation is not adapter.instrumentation
+    assert clone.poolmanager.instrumentation is clone.instrumentation
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.lazy."""
+
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import types
+
+import pytest
+
+from radio_analyser import lazy
+
+_names = ('lazy_fixture_%d' % i for i in itertools.count())
+
+SLOW_PACKAGE = '''
+import time
+EARLY = 'early'
+time.sleep(0.2)
+import {name}.sub
+VALUE = 'loaded'
+'''
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    """Write a package whose ``__init__`` runs ``code``; return its name."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    def make(code, sub='SUB = 1\n'):
+        name = next(_names)
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / '__init__.py').write_text(code.format(name=name))
+        (directory / 'sub.py').write_text(sub)
+        (directory / 'version.py').write_text("__version__ = '1.2.3'\n")
+        made.append(name)
+        return name
+
+    made = []
+    yield make
+    for name in made:
+        for module in list(sys.modules):
+            if module == name or module.startswith(name + '.'):
+                del sys.modules[module]
+
+
+def test_defers_until_missing_attribute(package):
+    name = package("VALUE = 'loaded'\n")
+    assert lazy.defer(name, 'version.py')
+    module = sys.modules[name]
+    assert not lazy.is_loaded(name)
+    assert module.__version__ == '1.2.3'
+    assert not lazy.is_loaded(name)
+
+    assert module.VALUE == 'loaded'
+    assert lazy.is_loaded(name)
+    assert type(module) is types.ModuleType
+    with pytest.raises(AttributeError):
+        module.missing
+
+
+def test_defer_skips_imported_and_unknown_modules():
+    assert not lazy.defer('os')
+    assert not lazy.defer('no_such_module_anywhere')
+
+
+def test_failed_load_is_retried(package):
+    name = package("import os\nif os.environ.get('LAZY_FAIL'):\n"
+                   "    raise ImportError('boom')\nVALUE = 1\n")
+    lazy.defer(name)
+    os.environ['LAZY_FAIL'] = '1'
+    try:
+        with pytest.raises(ImportError):
+            sys.modules[name].VALUE
+    finally:
+        del os.environ['LAZY_FAIL']
+    assert not lazy.is_loaded(name)
+    assert sys.modules[name].VALUE == 1
+
+
+def test_concurrent_lookups_wait_for_load(package):
+    name = package(SLOW_PACKAGE)
+    lazy.defer(name)
+    module = sys.modules[name]
+    start = threading.Barrier(8)
+    results, errors = [], []
+
+    def lookup():
+        start.wait()
+        try:
+            results.append((module.VALUE, module.sub.SUB))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == []
+    assert results == [('loaded', 1)] * 8
+
+
+def test_enable_defers_requests_dependencies():
+    code = ('import radio_analyser, sys, requests\n'
+            'from radio_analyser import lazy\n'
+            'before = [lazy.is_loaded(n) for n in lazy.LAZY_MODULES]\n'
+            'r = requests.Response()\n'
+            'r._content = b"\\xe9t\\xe9"\n'
+            'r.apparent_encoding\n'
+            'print(before, lazy.is_loaded("charset_normalizer"))\n')
+    env = dict(os.environ, RADIO_ANALYSER_LAZY_IMPORTS='1',
+               PYTHONPATH=os.pathsep.join(sys.path))
+    out = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True,
+                         timeout=60).stdout
+    assert out.strip() == '[False, False] True'
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.mess."""
+
+import gc
+import json
+
+import pytest
+from charset_normalizer import api, from_bytes, md
+from charset_normalizer.constant import IANA_SUPPORTED
+
+from radio_analyser import mess
+
+TEXTS = {
+    'en': u'Radio One - now playing: The Quick Brown Fox (live), 128kbps',
+    'fr': u'Radio Café Señal - Le cœur déçu, l\'âme plutôt naïve, à Zürich',
+    'de': u'Zwölf Boxkämpfer jagen Viktor quer über den großen Sylter Deich',
+    'ru': u'Съешь же ещё этих мягких французских булок да выпей чаю',
+    'el': u'Τάχιστη αλώπηξ βαφής ψημένη γη, δρασκελίζει υπέρ νωθρού κυνός',
+    'zh': u'我能吞下玻璃而不伤身体。北京人民广播电台，现在播放新闻。',
+    'ja': u'いろはにほへと ちりぬるを わかよたれそ つねならむ ラジオ放送',
+    'ko': u'키스의 고유조건은 입술끼리 만나야 하고 특별한 기술은 필요치 않다',
+}
+
+SINGLE_BYTE = [('en', 'ascii'), ('fr', 'cp1252'), ('de', 'latin_1'),
+               ('ru', 'koi8_r'), ('el', 'iso8859_7')]
+MULTI_BYTE = [('ru', 'utf_8'), ('zh', 'gb18030'), ('ja', 'shift_jis'),
+              ('ko', 'euc_kr'), ('de', 'utf_16_le')]
+
+original = md.mess_ratio.__wrapped__
+batched = mess.mess_ratio.__wrapped__
+
+
+def _corpus(payloads):
+    """Each payload's head decoded with every codec that accepts it."""
+    for language, codec in payloads:
+        body = json.dumps([{'station': TEXTS[language], 'rssi': -71}] * 12,
+                          ensure_ascii=False).encode(codec)
+        for candidate in IANA_SUPPORTED:
+            try:
+                yield body[:512].decode(candidate)
+            except (UnicodeDecodeError, LookupError):
+                continue
+
+
+@pytest.fixture
+def restore_api():
+    yield
+    mess.disable()
+
+
+@pytest.mark.parametrize('payloads', [SINGLE_BYTE, MULTI_BYTE],
+                         ids=['single-byte', 'multi-byte'])
+def test_matches_original_on_corpus(payloads):
+    chunks = list(_corpus(payloads))
+    assert chunks
+    for chunk in chunks:
+        for threshold in (0.2, 1e9):
+            assert batched(chunk, threshold) == original(chunk, threshold), \
+                chunk[:40]
+
+
+@pytest.mark.parametrize('text', [
+    u'',
+    u'a',
+    u'!!!!!!!!',
+    u'!\x00\x00!\x00!',                     # repeats across hidden characters
+    u'\x01\x02\x03 abc \x7f',
+    u'aàaàaàaà éé èè',                      # duplicate accents
+    u'à́b',
+    u'ᚠᛇᚻ᛫ᛒᛦᚦ ᚠᚱᚩᚠᚢᚱ ☃☃ ∀∂∈',            # ranges without a Latin pair
+    u'͸͹ ',           # code points without a range
+    u'aBcDeFgHiJkLmN ÀbÇdÈfĜhÏjǨl',         # archaic upper/lower runs
+    u'中文。中文。abc。中文，',               # CJK stops
+    u'supercalifragilisticexpialidocious' * 3,
+    u'éèêëàâäôöûüçñ ' * 10,
+    u'Съешь ещё Στάχιστη 中文 한국어 ' * 40,
+])
+def test_matches_original_on_edge_cases(text):
+    for threshold in (0.0, 0.2, 1.0, 1e9):
+        assert batched(text, threshold) == original(text, threshold)
+
+
+@pytest.mark.parametrize('size', [31, 33, 97, 511, 512, 1024, 1025, 2049])
+def test_checkpoints_follow_original(size):
+    text = (u'Zürich ½ Ω, ' * 400)[:size]
+    for threshold in (0.01, 0.2, 1e9):
+        assert batched(text, threshold) == original(text, threshold)
+
+
+def test_extra_plugin_falls_back_to_original():
+    calls = []
+
+    class CountingPlugin(md.MessDetectorPlugin):
+        def eligible(self, character):
+            calls.append(character)
+            return False
+
+        def feed(self, character):
+            pass
+
+        def reset(self):
+            pass
+
+        @property
+        def ratio(self):
+            return 0.0
+
+    try:
+        assert batched(u'fallback test chunk', 1e9) == \
+            original(u'fallback test chunk', 1e9)
+        assert calls
+    finally:
+        del CountingPlugin
+        gc.collect()
+    assert len(md.MessDetectorPlugin.__subclasses__()) == len(mess.PLUGINS)
+
+
+def test_enable_keeps_detection(restore_api):
+    body = json.dumps([{'station': TEXTS['fr']}] * 8,
+                      ensure_ascii=False).encode('cp1252')
+    expected = from_bytes(body).best().encoding
+    mess.enable()
+    assert api.mess_ratio is mess.mess_ratio
+    mess.mess_ratio.cache_clear()
+    assert from_bytes(body).best().encoding == expected
+    mess.disable()
+    assert api.mess_ratio is md.mess_ratio
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.streaming."""
+
+import io
+import json
+
+import pytest
+import requests
+
+from radio_analyser.streaming import JSONRecordSplitter, iter_json
+
+
+def _split(text, chunk_size, lines=None):
+    splitter = JSONRecordSplitter(lines=lines)
+    records = []
+    for i in range(0, len(text), chunk_size):
+        records.extend(splitter.feed(text[i:i + chunk_size]))
+    records.extend(splitter.close())
+    return records
+
+
+def _response(body, encoding=None):
+    r = requests.Response()
+    r.raw = io.BytesIO(body)
+    r.encoding = encoding
+    return r
+
+
+ARRAY = json.dumps([
+    {'a': 'x"y\\', 'b': [1, 2, {'c': None}]},
+    1, 'two', True, None, -2.5e3, [], {},
+])
+
+
+@pytest.mark.parametrize('chunk_size', range(1, len(ARRAY) + 1))
+def test_array_elements_at_every_chunk_size(chunk_size):
+    assert _split(ARRAY, chunk_size) == json.loads(ARRAY)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_ndjson_values(chunk_size):
+    text = '{"a": 1}\n2\n"x"\n[1]\ntrue'
+    assert _split(text, chunk_size) == [{'a': 1}, 2, 'x', [1], True]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_ndjson_of_arrays(chunk_size):
+    text = '[1,2]\n[3,4]\n\n["a", {"b": []}]\n'
+    assert _split(text, chunk_size, lines=True) == [[1, 2], [3, 4],
+                                                     ['a', {'b': []}]]
+    with pytest.raises(json.JSONDecodeError):
+        _split(text, chunk_size)
+
+
+def test_explicit_array_layout():
+    assert _split(' [1, [2]]', 2, lines=False) == [1, [2]]
+    with pytest.raises(json.JSONDecodeError):
+        _split('{"a": 1}', 2, lines=False)
+
+
+@pytest.mark.parametrize('text', ['[]', ' [ ] ', u'\ufeff[]'])
+def test_empty_array(text):
+    assert _split(text, 1) == []
+
+
+@pytest.mark.parametrize('text', [
+    '[1,,2]', '[1 2]', '[{"a": 1}{"b": 2}]', '[,1]', '[1,]', '[1',
+    '[1] x', '["a"', '{"a": 1',
+])
+@pytest.mark.parametrize('chunk_size', [1, 2, 64])
+def test_invalid_json_raises(text, chunk_size):
+    with pytest.raises(json.JSONDecodeError):
+        _split(text, chunk_size)
+
+
+def test_record_spanning_many_chunks():
+    value = 'x' * 100000
+    assert _split(json.dumps([value, value]), 1000) == [value, value]
+
+
+def test_iter_json_detects_utf16():
+    body = json.dumps([{'name': u'Radio Fünf'}]).encode('utf-16-le')
+    records = list(iter_json(_response(body), chunk_size=5))
+    assert records == [{'name': u'Radio Fünf'}]
+
+
+def test_iter_json_passes_loads_kwargs():
+    records = iter_json(_response(b'[1.5]'), parse_float=str)
+    assert list(records) == ['1.5']
+
+
+def test_iter_json_lines():
+    body = b'[1, "a"]\n[2, "b"]\n'
+    assert list(iter_json(_response(body), chunk_size=3, lines=True)) == [
+        [1, 'a'], [2, 'b']]
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for radio_analyser.templates."""
+
+import io
+import json
+
+import pytest
+
+from radio_analyser.sessions import Session
+
+
+def _session():
+    session = Session()
+    session.trust_env = False
+    return session
+
+
+def test_matches_session_prepare():
+    session = _session()
+    session.headers['X-Fleet'] = 'north'
+    session.params = {'v': '2'}
+    template = session.template('get', 'http://radio.local/status',
+                                params={'q': 'a b'}, headers={'X-Id': '7'})
+    p = template.prepare()
+    assert p.method == 'GET'
+    assert p.url == 'http://radio.local/status?v=2&q=a+b'
+    assert p.headers['X-Fleet'] == 'north'
+    assert p.headers['X-Id'] == '7'
+
+
+def test_none_session_header_is_dropped():
+    session = _session()
+    session.headers['Accept-Encoding'] = None
+    p = session.template('GET', 'http://radio.local/').prepare()
+    assert 'Accept-Encoding' not in p.headers
+
+
+def test_none_template_header_removes_session_header():
+    session = _session()
+    p = session.template('GET', 'http://radio.local/',
+                         headers={'User-Agent': None}).prepare()
+    assert 'User-Agent' not in p.headers
+
+
+def test_none_session_param_is_dropped():
+    session = _session()
+    session.params = {'debug': None, 'v': '2'}
+    p = session.template('GET', 'http://radio.local/').prepare()
+    assert p.url == 'http://radio.local/?v=2'
+
+
+def test_json_body_on_form_template():
+    template = _session().template('POST', 'http://radio.local/',
+                                   data={'volume': '3'})
+    assert template.prepare().headers['Content-Type'] == \
+        'application/x-www-form-urlencoded'
+
+    p = template.prepare(json={'volume': 4})
+    assert p.headers['Content-Type'] == 'application/json'
+    assert json.loads(p.body) == {'volume': 4}
+    assert p.headers['Content-Length'] == str(len(p.body))
+
+
+def test_raw_body_on_json_template():
+    template = _session().template('POST', 'http://radio.local/',
+                                   json={'volume': 3})
+    p = template.prepare(data=b'volume=4')
+    assert 'Content-Type' not in p.headers
+    assert p.body == b'volume=4'
+    assert p.headers['Content-Length'] == '8'
+    # The template itself is untouched.
+    assert template.prepare().headers['Content-Type'] == 'application/json'
+
+
+def test_send_headers_win_over_new_body():
+    template = _session().template('POST', 'http://radio.local/',
+                                   data={'volume': '3'})
+    p = template.prepare(headers={'Content-Type': 'text/plain'},
+                         data='volume=4')
+    assert p.headers['Content-Type'] == 'text/plain'
+
+
+def test_recompiles_when_session_changes():
+    session = _session()
+    template = session.template('GET', 'http://radio.local/')
+    assert 'X-Fleet' not in template.prepare().headers
+    session.headers['X-Fleet'] = 'south'
+    assert template.prepare().headers['X-Fleet'] == 'south'
+
+
+def test_session_cookies_are_current():
+    session = _session()
+    template = session.template('GET', 'http://radio.local/',
+                                cookies={'a': '1'})
+    session.cookies.set('token', 'x')
+    cookie = template.prepare().headers['Cookie']
+    assert 'token=x' in cookie and 'a=1' in cookie
+
+
+def test_basic_auth_is_baked_in():
+    session = _session()
+    session.auth = ('user', 'secret')
+    p = session.template('GET', 'http://radio.local/').prepare()
+    assert p.headers['Authorization'].startswith('Basic ')
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'files': {'f': b'x'}},
+    {'data': io.BytesIO(b'x')},
+    {'data': (c for c in 'x')},
+])
+def test_rejects_non_reusable_body(kwargs):
+    with pytest.raises(ValueError):
+        _session().template('POST', 'http://radio.local/', **kwargs)
+
+
+def test_send(server):
+    session = _session()
+    template = session.template('POST', server.url + '/volume',
+                                data={'volume': '3'})
+    assert template.send(json={'volume': 4}, timeout=5).content == b'ok'
+    assert template.send(timeout=5).content == b'ok'
+
+    (_, path, headers, body), (_, _, headers2, body2) = server.requests
+    assert path == '/volume'
+    assert headers['Content-Type'] == 'application/json'
+    assert json.loads(body) == {'volume': 4}
+    assert headers2['Content-Type'] == 'application/x-www-form-urlencoded'
+    assert body2 == b'volume=3'